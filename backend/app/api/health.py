@@ -0,0 +1,20 @@
+"""
+File containing the health endpoint.
+"""
+
+from fastapi import APIRouter
+
+from app.api.responses import FastJSONResponse
+from app.core.readiness import get_status
+
+router = APIRouter()
+
+
+@router.get("/health")
+async def get_health():
+    """
+    Report readiness: 200 once the database and the MQTT broker are reachable,
+    503 with the state of each component until then.
+    """
+    status = get_status()
+    return FastJSONResponse(status, status_code=200 if status["ready"] else 503)
@@ -0,0 +1,66 @@
+"""
+File containing the metrics endpoint and request instrumentation.
+"""
+
+import time
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.config.database import Database
+from app.services.metrics import CONTENT_TYPE, Callback, Histogram, render_metrics
+
+router = APIRouter()
+
+REQUEST_SECONDS = Histogram(
+    "orchestralink_http_request_duration_seconds", "API request latency by route template.",
+    ("method", "route", "status"),
+)
+
+
+def _pool_metric(key):
+    return lambda: [((name,), stats[key]) for name, stats in Database.pool_stats().items()]
+
+
+for _name, _key, _type, _help in (
+    ("checked_out", "checked_out", "gauge", "Connections currently checked out of the pool."),
+    ("checkouts_total", "checkouts", "counter", "Connections checked out of the pool."),
+    ("checkout_timeouts_total", "checkout_timeouts", "counter", "Checkouts that timed out waiting for a connection."),
+    ("wait_seconds_total", "wait_seconds_total", "counter", "Time spent waiting for a pooled connection."),
+    ("queries_total", "queries", "counter", "Statements executed."),
+    ("query_errors_total", "query_errors", "counter", "Statements that raised an error."),
+    ("query_seconds_total", "query_seconds_total", "counter", "Time spent executing statements."),
+):
+    Callback(f"orchestralink_db_pool_{_name}", _help, ("pool",), _pool_metric(_key), _type)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording the latency of every HTTP request by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = ["500"]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            REQUEST_SECONDS.labels(scope["method"], path, status[0]).observe(time.perf_counter() - started)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Expose every metric in the Prometheus text format."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
@@ -0,0 +1,69 @@
+"""
+File contains response encoding logic.
+
+Large read responses skip FastAPI's jsonable_encoder: routes return a
+FastJSONResponse directly, which hands plain dicts, lists and datetimes to
+orjson (or to the standard json module when orjson is not installed).
+"""
+
+import json
+from datetime import datetime
+
+from fastapi.responses import JSONResponse
+
+from app.services.export import MEDIA_TYPES, available_formats, encode_chunks
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+ARROW_MEDIA_TYPE = MEDIA_TYPES["arrow"]
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available, without jsonable_encoder."""
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def columnar_series(machine_name, series, rows):
+    """
+    Group raw (id, timestamp, value, series_id) rows by series, one array per field.
+
+    :param series: {series_id: (topic, unit)} covering every row.
+    :return: List of {"machine_name", "topic", "unit", "ids", "timestamps", "values"}
+             in order of each series' first row.
+    """
+    columns = {}
+    for entry_id, timestamp, value, series_id in rows:
+        column = columns.get(series_id)
+        if column is None:
+            topic, unit = series[series_id]
+            column = columns[series_id] = {
+                "machine_name": machine_name, "topic": topic, "unit": unit,
+                "ids": [], "timestamps": [], "values": [],
+            }
+        column["ids"].append(entry_id)
+        column["timestamps"].append(timestamp)
+        column["values"].append(value)
+    return list(columns.values())
+
+
+def accepts_arrow(accept):
+    """Whether an Accept header asks for an Arrow IPC stream this process can produce."""
+    return ARROW_MEDIA_TYPE in (accept or "") and "arrow" in available_formats()
+
+
+def arrow_body(machine_name, series, rows):
+    """Encode raw rows as one Arrow IPC stream (same schema as the Arrow export)."""
+    return b"".join(encode_chunks("arrow", machine_name, series, [rows] if rows else []))
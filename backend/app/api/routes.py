@@ -2,39 +2,283 @@
 File containing routing logic.
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+import binascii
+import hashlib
+import re
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.models.models import MachineData
+from app.models.models import MachineData, Series
 from app.config.database import Database
+from app.api.responses import ARROW_MEDIA_TYPE, FastJSONResponse, accepts_arrow, arrow_body, columnar_series
+from app.core.state_manager import get_latest
+from app.services.aggregation import aggregate_buckets, downsample_points
+from app.services.bulk import parse_readings, validate_readings
+from app.services.export import EXTENSIONS, MEDIA_TYPES, available_formats, stream_export
+from app.services.ingestion import get_ingestion_writer
 
 router = APIRouter()
 
+MAX_PAGE_SIZE = 10000
+MAX_BUCKETS = 10000
+MAX_BULK_READINGS = 100000
+
 def get_db():
     """Dependency to provide a database session."""
     try:
-        db = Database.get_session()
+        db = Database.get_api_session()
         yield db
     finally:
         db.close()
 
+async def get_async_db():
+    """
+    Dependency to provide an AsyncSession, or a sync Session when the async
+    engine is not enabled. Pass the result to run_db rather than using it directly.
+    """
+    if Database.async_enabled():
+        async with Database.get_async_session() as db:
+            yield db
+    else:
+        db = Database.get_api_session()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Run fn(session, *args, **kwargs) without blocking the event loop.
+
+    On the async engine the sync query code runs against the AsyncSession's
+    greenlet-backed facade, so waiting on the database holds no thread; the sync
+    fallback borrows a threadpool slot as before.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+def naive_utc(value):
+    """Convert an aware datetime to the naive UTC form timestamps are stored in; naive values are taken as UTC."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def encode_cursor(entry):
+    """Encode the (timestamp, id) position of an entry as an opaque cursor."""
+    raw = f"{entry['timestamp'].isoformat()}|{entry['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor back into (timestamp, id)."""
+    try:
+        timestamp, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(entry_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+def page_etag(query, series, rows, next_cursor):
+    """
+    ETag of one page of readings: changes with the normalized query and with
+    the committed rows the page holds. Readings are never updated in place, so
+    their ids identify them.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((query, sorted(series.items()), next_cursor)).encode())
+    digest.update(array("q", [row[0] for row in rows]).tobytes())
+    return f'"{digest.hexdigest()}"'
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header matches `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in (candidate[2:] if candidate.startswith("W/") else candidate
+                                         for candidate in candidates)
+
 @router.get("/machine-data")
-def get_machine_data(machine_name: str, db: Session = Depends(get_db)):
-    data = MachineData.get_all_entries(db, machine_name)
-    if not data:
+async def get_machine_data(
+    request: Request,
+    machine_name: str,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    topic: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = Query(None, description="Only readings with a later timestamp."),
+    since_id: Optional[int] = Query(None, description="Only readings stored after the one with this id."),
+    order: str = Query("asc", regex="^(asc|desc)$",
+                       description="'asc': oldest first; 'desc': newest first, cursors continue towards older readings."),
+    layout: str = Query("rows", regex="^(rows|columns)$",
+                        description="'rows': one object per reading; 'columns': one set of arrays per series."),
+    db: Session = Depends(get_async_db),
+):
+    """
+    Return one page of a machine's readings ordered by time, oldest first
+    unless `order=desc` asks for the newest readings first.
+
+    Responses carry an ETag derived from the query and the rows it returned; a
+    request with a matching `If-None-Match` gets 304 without a body. Pollers
+    pass an id they hold as `since_id` to fetch only newer readings; since ids
+    are not committed in order, it should trail the highest one they hold
+    (see MachineData.get_rows_page).
+
+    Send `Accept: application/vnd.apache.arrow.stream` to receive the page as an
+    Arrow IPC stream instead, with the next cursor in the `X-Next-Cursor` header.
+    """
+    start, end, since = naive_utc(start), naive_utc(end), naive_utc(since)
+    arrow = accepts_arrow(request.headers.get("accept"))
+    after = decode_cursor(cursor) if cursor else None
+    rows, series, has_more = await run_db(
+        db, MachineData.get_rows_page, machine_name, start=start, end=end, topic=topic, limit=limit, after=after,
+        since=since, since_id=since_id, descending=order == "desc",
+    )
+    if not series or (not rows and after is None and since is None and since_id is None):
         raise HTTPException(status_code=404, detail="Machine data not found")
-    return {"data": data}
+    next_cursor = encode_cursor({"timestamp": rows[-1][1], "id": rows[-1][0]}) if has_more else None
 
-@router.post("/machine-data")
-def add_machine_data(machine_name: str, topic: str, value: float, unit: str, db: Session = Depends(get_db)):
+    query = (machine_name, start, end, topic, limit, cursor, since, since_id, order, "arrow" if arrow else layout)
+    etag = page_etag(query, series, rows, next_cursor)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if arrow:
+        body = await run_in_threadpool(arrow_body, machine_name, series, rows)
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        return Response(body, media_type=ARROW_MEDIA_TYPE, headers=headers)
+    if layout == "columns":
+        content = {"series": columnar_series(machine_name, series, rows), "next_cursor": next_cursor}
+    else:
+        data = [MachineData.to_dict(row, machine_name, *series[row[3]]) for row in rows]
+        content = {"data": data, "next_cursor": next_cursor}
+    return FastJSONResponse(content, headers=headers)
+
+@router.get("/machine-data/export")
+async def export_machine_data(
+    machine_name: str,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    topic: Optional[str] = None,
+    export_format: str = Query("ndjson", alias="format", description="ndjson, csv or arrow."),
+    db: Session = Depends(get_async_db),
+):
+    """
+    Stream a machine's full history, optionally limited to a window and topic,
+    as NDJSON, CSV or an Arrow IPC stream. Readings are ordered by topic, then time.
+    """
+    if export_format not in available_formats():
+        formats = ", ".join(available_formats())
+        raise HTTPException(status_code=400, detail=f"Unsupported format, use one of: {formats}")
+    start, end = naive_utc(start), naive_utc(end)
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be earlier than 'to'")
+    series = await run_db(db, Series.for_machine, machine_name, topic)
+    if not series:
+        raise HTTPException(status_code=404, detail="Machine data not found")
+    filename = f"{re.sub(r'[^A-Za-z0-9_.-]', '_', machine_name)}.{EXTENSIONS[export_format]}"
+    return StreamingResponse(
+        stream_export(machine_name, series, export_format, start=start, end=end),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/machine-data/latest")
+async def get_latest_machine_data(machine_name: Optional[str] = None, topic: Optional[str] = None):
+    """Return the latest reading per (machine, topic) from memory; omit filters for a fleet snapshot."""
+    latest = get_latest(machine_name, topic)
+    if machine_name is not None and not latest:
+        raise HTTPException(status_code=404, detail="Machine data not found")
+    return {
+        "data": {
+            name: {series: value._asdict() for series, value in topics.items()}
+            for name, topics in latest.items()
+        }
+    }
+
+@router.get("/machine-data/aggregate")
+async def get_machine_data_aggregate(
+    machine_name: str,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    topic: Optional[str] = None,
+    resolution: Optional[float] = Query(None, gt=0, description="Bucket width in seconds."),
+    points: Optional[int] = Query(None, ge=3, le=MAX_BUCKETS, description="LTTB point budget per topic."),
+    db: Session = Depends(get_async_db),
+):
+    """
+    Return per-topic time buckets (min/max/avg/count/last) for a window, or an
+    LTTB-downsampled series of at most `points` readings per topic.
+    Defaults to the last hour.
+    """
+    end = naive_utc(end) or datetime.utcnow()
+    start = naive_utc(start) or end - timedelta(hours=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be earlier than 'to'")
+    if (resolution is None) == (points is None):
+        raise HTTPException(status_code=400, detail="Specify exactly one of 'resolution' or 'points'")
+
+    if points is not None:
+        series = await run_db(db, downsample_points, machine_name, start, end, points, topic=topic)
+        return {"from": start, "to": end, "points": points, "series": series}
+
+    if (end - start).total_seconds() / resolution > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Requested window exceeds {MAX_BUCKETS} buckets")
+    series = await run_db(db, aggregate_buckets, machine_name, start, end, resolution, topic=topic)
+    return {"from": start, "to": end, "resolution": resolution, "series": series}
+
+def _create_entry(db, machine_name, topic, value, unit):
     entry = MachineData.create_entry(db, machine_name, topic, value, unit)
-    return {"message": "Data added successfully", "data": entry}
+    return MachineData.to_dict((entry.id, entry.timestamp, entry.value), machine_name, topic, unit)
+
+@router.post("/machine-data")
+async def add_machine_data(machine_name: str, topic: str, value: float, unit: str, db: Session = Depends(get_async_db)):
+    data = await run_db(db, _create_entry, machine_name, topic, value, unit)
+    return {"message": "Data added successfully", "data": data}
+
+@router.post("/machine-data/bulk")
+async def add_machine_data_bulk(request: Request, db: Session = Depends(get_db)):
+    """
+    Store many readings of any machines and topics at once, as a JSON array,
+    NDJSON or compact column-wise JSON (see app/services/bulk.py). Valid readings
+    are written in one bulk insert; invalid ones are reported by index.
+    """
+    body = await request.body()
+    try:
+        count, columns = await run_in_threadpool(
+            parse_readings, body, request.headers.get("content-type", "application/json")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    if count > MAX_BULK_READINGS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_READINGS} readings per request")
+    rows, rejected = await run_in_threadpool(validate_readings, count, columns)
+    # Sync session on purpose: the PostgreSQL COPY path needs a psycopg2 connection.
+    written = await run_in_threadpool(MachineData.bulk_create, db, rows)
+    return {"received": count, "written": written, "rejected": rejected}
 
 @router.delete("/machine-data/{entry_id}")
-def delete_machine_data(entry_id: int, db: Session = Depends(get_db)):
-    entry = db.query(MachineData).filter(MachineData.id == entry_id).first()
-    if not entry:
-        raise HTTPException(status_code=404, detail="Entry not found")
-    db.delete(entry)
-    db.commit()
+async def delete_machine_data(entry_id: int, db: Session = Depends(get_async_db)):
+    try:
+        await run_db(db, MachineData.delete_entry, entry_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail="Entry not found") from e
     return {"message": "Entry deleted successfully"}
 
+
+@router.get("/ingestion/stats")
+async def get_ingestion_stats():
+    """Report queue depth, batch sizes and flush latency of the ingestion writer."""
+    return get_ingestion_writer().stats()
+
+@router.get("/database/stats")
+async def get_database_stats():
+    """Report checked-out connections, checkout wait and query latency per connection pool."""
+    return Database.pool_stats()
@@ -0,0 +1,134 @@
+"""
+File containing live streaming routes (WebSocket and Server-Sent Events).
+"""
+
+import json
+import asyncio
+import logging
+from typing import List, Optional
+from fastapi import APIRouter, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.services.streaming import get_stream_hub, reading_to_dict
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Seconds between SSE keep-alive comments when no readings arrive.
+SSE_KEEPALIVE = 15
+
+
+def parse_filter(values):
+    """Accept repeated and/or comma-separated query values."""
+    if not values:
+        return None
+    return {item.strip() for value in values for item in value.split(",") if item.strip()}
+
+
+def parse_filter_update(text):
+    """
+    Return (machines, topics) from a WebSocket filter update.
+
+    Each field may be a list of names, a comma-separated string, null or
+    missing; the latter three and an empty list mean "all".
+
+    :raises ValueError: If the message is not a JSON object of such fields.
+    """
+    try:
+        message = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"Filter update is not valid JSON: {e}") from e
+    if not isinstance(message, dict):
+        raise ValueError("Filter update must be a JSON object.")
+    filters = []
+    for field in ("machine_name", "topic"):
+        value = message.get(field)
+        if isinstance(value, str):
+            value = [value]
+        if value is not None and (not isinstance(value, list) or not all(isinstance(v, str) for v in value)):
+            raise ValueError(f"{field} must be a string or a list of strings.")
+        filters.append(parse_filter(value))
+    return tuple(filters)
+
+
+def batch_message(subscription, batch):
+    """Build the payload sent to a client for one batch of readings."""
+    return {
+        "type": "readings",
+        "data": [reading_to_dict(reading) for reading in batch],
+        "dropped": subscription.dropped,
+        "coalesced": subscription.coalesced,
+    }
+
+
+@router.websocket("/machine-data/ws")
+async def stream_machine_data_ws(
+    websocket: WebSocket,
+    machine_name: Optional[List[str]] = Query(None),
+    topic: Optional[List[str]] = Query(None),
+):
+    """
+    Push new readings over a WebSocket.
+
+    Clients may change their filters at any time by sending
+    {"machine_name": [...], "topic": [...]}; an empty list means "all".
+    Malformed updates are answered with an {"type": "error"} message and
+    leave the filters unchanged.
+    """
+    hub = get_stream_hub()
+    await websocket.accept()
+    subscription = hub.subscribe(parse_filter(machine_name), parse_filter(topic))
+
+    async def receive_updates():
+        while True:
+            try:
+                machines, topics = parse_filter_update(await websocket.receive_text())
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            subscription.update(machines, topics)
+            snapshot = hub.snapshot(subscription.machines, subscription.topics)
+            await websocket.send_json({"type": "snapshot", "data": [reading_to_dict(r) for r in snapshot]})
+
+    receiver = asyncio.ensure_future(receive_updates())
+    try:
+        snapshot = hub.snapshot(subscription.machines, subscription.topics)
+        await websocket.send_json({"type": "snapshot", "data": [reading_to_dict(r) for r in snapshot]})
+        while not receiver.done():
+            batch = await subscription.next_batch(timeout=SSE_KEEPALIVE)
+            if batch:
+                await websocket.send_json(batch_message(subscription, batch))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        hub.unsubscribe(subscription)
+
+
+@router.get("/machine-data/stream")
+async def stream_machine_data_sse(
+    request: Request,
+    machine_name: Optional[List[str]] = Query(None),
+    topic: Optional[List[str]] = Query(None),
+):
+    """Push new readings as Server-Sent Events, starting with a snapshot event."""
+    hub = get_stream_hub()
+    machines, topics = parse_filter(machine_name), parse_filter(topic)
+
+    async def events():
+        subscription = hub.subscribe(machines, topics)
+        try:
+            snapshot = [reading_to_dict(r) for r in hub.snapshot(machines, topics)]
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            while not await request.is_disconnected():
+                batch = await subscription.next_batch(timeout=SSE_KEEPALIVE)
+                if batch:
+                    yield f"event: readings\ndata: {json.dumps(batch_message(subscription, batch))}\n\n"
+                else:
+                    yield ": keep-alive\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
@@ -0,0 +1,35 @@
+"""
+Module for managing ingestion-specific environment configuration.
+"""
+
+import os
+
+# Flush a batch once it holds this many readings...
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 5000))
+# ...or once the oldest reading in it has waited this many seconds.
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", 0.2))
+# Upper bound on readings waiting for the writer thread.
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 100000))
+# Number of shared-subscription ingestion worker processes (python -m app.services.ingest_workers).
+# When > 0 the API process leaves storage to them and only keeps its live state current.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 0))
+# MQTT v5 shared subscription group the workers join.
+INGEST_SHARE_GROUP = os.getenv("INGEST_SHARE_GROUP", "ingest")
+# Seconds between per-worker throughput reports.
+INGEST_REPORT_INTERVAL = float(os.getenv("INGEST_REPORT_INTERVAL", 10))
+
+# Local write-ahead buffer the writer spills batches to while the database is
+# unavailable or falling behind (app/services/spill.py). Empty SPILL_DIR disables it.
+SPILL_DIR = os.getenv("SPILL_DIR", "spill")
+# Size at which a spill segment file is sealed and a new one started.
+SPILL_SEGMENT_BYTES = int(os.getenv("SPILL_SEGMENT_BYTES", 64 * 1024 * 1024))
+# Upper bound on spilled data; the oldest segments are discarded beyond it.
+SPILL_MAX_BYTES = int(os.getenv("SPILL_MAX_BYTES", 1024 * 1024 * 1024))
+# fsync every spilled batch (survives power loss, costs one disk flush per batch).
+SPILL_FSYNC = os.getenv("SPILL_FSYNC", "false").lower() in ("1", "true", "yes")
+# Spill instead of writing while the queue is fuller than this fraction of INGEST_QUEUE_SIZE.
+SPILL_HIGH_WATERMARK = float(os.getenv("SPILL_HIGH_WATERMARK", 0.8))
+# Seconds to wait after a database error before trying the database again.
+SPILL_RETRY_INTERVAL = float(os.getenv("SPILL_RETRY_INTERVAL", 5))
+# Rate at which spilled readings are replayed into the database once it recovers.
+SPILL_REPLAY_ROWS_PER_SECOND = float(os.getenv("SPILL_REPLAY_ROWS_PER_SECOND", 20000))
@@ -1,23 +1,92 @@
 """
 File contains logging logic.
+
+Application threads only put records on an in-memory queue; a QueueListener
+thread formats them and writes the console and rotating file handlers, so
+disk I/O never blocks the MQTT network thread or the event loop. Loggers on
+the per-message hot path are additionally rate limited.
 """
 
+import atexit
+import os
+import queue
+import threading
+import time
 import logging
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
 LOGS_DIR = Path(__file__).resolve().parent / 'logs'
-LOGS_DIR.mkdir(parents=True, exist_ok=True)
 
 LOG_FILE = LOGS_DIR / 'app.log'
 ERROR_LOG_FILE = LOGS_DIR / 'error.log'
 
+# Root log level.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Log every received and published reading at INFO; otherwise they are DEBUG-only.
+LOG_PER_MESSAGE = os.getenv("LOG_PER_MESSAGE", "false").lower() in ("1", "true", "yes")
+PER_MESSAGE_LEVEL = logging.INFO if LOG_PER_MESSAGE else logging.DEBUG
+# Records per second each hot-path logger may emit, and how many may burst above that.
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", 10))
+LOG_RATE_BURST = int(os.getenv("LOG_RATE_BURST", 50))
+
+# Loggers that may log once per reading.
+HOT_PATH_LOGGERS = ("app.services.mqtt_manager", "app.services.ingestion")
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per (logger, level): lets `burst` records through at once and
+    `rate` records per second after that. The number of suppressed records is
+    stored on the next record that gets through as `record.suppressed`, for
+    SuppressedCountFormatter to print; the message itself is left untouched.
+    """
+
+    def __init__(self, rate=LOG_RATE_LIMIT, burst=LOG_RATE_BURST):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.levelno)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, suppressed = self._buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now, suppressed + 1)
+                return False
+            self._buckets[key] = (tokens - 1, now, 0)
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class SuppressedCountFormatter(logging.Formatter):
+    """Appends the count RateLimitFilter stored on a record to its formatted message."""
+
+    def formatMessage(self, record):
+        message = super().formatMessage(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{message} ({suppressed} similar records suppressed)" if suppressed else message
+
+
 LOGGING_CONFIG = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
         'default': {
-            'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+            '()': SuppressedCountFormatter,
+            'fmt': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        },
+    },
+    'filters': {
+        'rate_limit': {
+            '()': RateLimitFilter,
         },
     },
     'handlers': {
@@ -43,15 +112,41 @@ LOGGING_CONFIG = {
             'formatter': 'default',
         },
     },
+    'loggers': {
+        name: {'filters': ['rate_limit']} for name in HOT_PATH_LOGGERS
+    },
     'root': {
-        'level': 'DEBUG',
+        'level': LOG_LEVEL,
         'handlers': ['file', 'error_file', 'console']
     },
 }
 
+_listener = None
+
+
 def setup_logging():
-    """Set up logging configuration."""
+    """Set up logging configuration and move the configured handlers behind a queue."""
+    global _listener  # pylint: disable=global-statement
+    if _listener is not None:
+        return
+    LOGS_DIR.mkdir(parents=True, exist_ok=True)
     dictConfig(LOGGING_CONFIG)
+
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    for handler in handlers:
+        root.removeHandler(handler)
+    log_queue = queue.Queue(-1)
+    root.addHandler(QueueHandler(log_queue))
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
     logging.getLogger(__name__).info("Logging initialized.")
 
-setup_logging()
+
+def stop_logging():
+    """Write out queued records and stop the listener thread."""
+    global _listener  # pylint: disable=global-statement
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -3,9 +3,26 @@ Module for managing MQTT-specific environment configuration.
 """
 
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
-load_dotenv("backend/app/config/.env")
+# Optional overrides next to this file; variables already set in the environment win.
+load_dotenv(Path(__file__).with_name(".env"))
 
 MQTT_BROKER = os.getenv("MQTT_BROKER", "mqtt-broker")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
+
+# Payload format published by the simulator: "text" sends one float per
+# parameter and message, "binary" one batch per machine and cycle (see
+# app/services/payload.py). The receiver accepts both.
+MQTT_PAYLOAD_FORMAT = os.getenv("MQTT_PAYLOAD_FORMAT", "text").lower()
+# Readings are published to machines/<machine>/<parameter>; binary batches of a
+# machine go to machines/<machine>/batch.
+TOPIC_PREFIX = "machines"
+BATCH_PARAMETER = "batch"
+TOPIC_FORMAT = TOPIC_PREFIX + "/{machine}/{parameter}"
+BATCH_TOPIC_FORMAT = TOPIC_PREFIX + "/{machine}/" + BATCH_PARAMETER
+# Comma-separated topic filters the ingesting backend subscribes to.
+MQTT_SUBSCRIPTIONS = [
+    topic.strip() for topic in os.getenv("MQTT_SUBSCRIPTIONS", TOPIC_PREFIX + "/+/+").split(",") if topic.strip()
+]
@@ -0,0 +1,54 @@
+"""
+Module for managing database pool environment configuration.
+
+Every setting can be given for all pools (e.g. DB_POOL_SIZE) or for one role
+(e.g. DB_API_POOL_SIZE); the role-specific variable wins. The ingestion
+writer uses the "ingest" pool and the API routes the "api" pool, so a burst
+of dashboard reads can never take the connections the writer needs.
+"""
+
+import os
+
+POOL_ROLES = ("ingest", "api")
+
+_DEFAULTS = {
+    "ingest": {
+        "POOL_SIZE": 5,
+        "MAX_OVERFLOW": 5,
+        "POOL_TIMEOUT": 30.0,
+        "POOL_RECYCLE": 1800,
+        "POOL_PRE_PING": True,
+        "STATEMENT_TIMEOUT_MS": 0,
+    },
+    "api": {
+        "POOL_SIZE": 10,
+        "MAX_OVERFLOW": 20,
+        "POOL_TIMEOUT": 10.0,
+        "POOL_RECYCLE": 1800,
+        "POOL_PRE_PING": True,
+        "STATEMENT_TIMEOUT_MS": 30000,
+    },
+}
+
+# Log every SQL statement; far too verbose for anything but debugging.
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+
+
+def _cast(value, default):
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes")
+    return type(default)(value)
+
+
+def pool_settings(role):
+    """
+    Return the pool settings of `role` with environment overrides applied.
+
+    Keys: pool_size, max_overflow, pool_timeout (seconds), pool_recycle
+    (seconds, -1 disables), pool_pre_ping, statement_timeout_ms (0 disables).
+    """
+    settings = {}
+    for name, default in _DEFAULTS[role].items():
+        value = os.getenv(f"DB_{role.upper()}_{name}", os.getenv(f"DB_{name}"))
+        settings[name.lower()] = default if value is None else _cast(value, default)
+    return settings
@@ -0,0 +1,39 @@
+"""
+Module for managing process-role configuration.
+
+A process runs any combination of three roles:
+
+* api: serves HTTP and keeps the latest-value store and live streams current
+  from its own (non-shared) MQTT subscription.
+* simulator: publishes the simulated machine's readings; it never writes to
+  the database.
+* ingestor: the only writer of received readings to the database.
+
+The default runs all three in one process, as before. To run the API with
+several workers, give it only the api role and run the simulator and the
+ingestor as separate processes (python -m app.main --roles ...).
+"""
+
+import os
+
+API = "api"
+SIMULATOR = "simulator"
+INGESTOR = "ingestor"
+ALL_ROLES = (API, SIMULATOR, INGESTOR)
+
+ROLES_ENV = "ORCHESTRALINK_ROLES"
+
+def parse_roles(value):
+    """Return the frozenset of roles in a comma-separated string; raise ValueError on unknown roles."""
+    roles = frozenset(role.strip().lower() for role in value.split(",") if role.strip())
+    unknown = roles.difference(ALL_ROLES)
+    if unknown:
+        raise ValueError(f"Unknown roles: {', '.join(sorted(unknown))} (expected {', '.join(ALL_ROLES)}).")
+    if not roles:
+        raise ValueError("At least one role is required.")
+    return roles
+
+# Roles of this process.
+ROLES = parse_roles(os.getenv(ROLES_ENV, ",".join(ALL_ROLES)))
+# Uvicorn worker processes serving the API role (python -m app.main only).
+API_WORKERS = int(os.getenv("API_WORKERS", 1))
@@ -0,0 +1,35 @@
+"""
+Module for managing simulator-specific environment configuration.
+"""
+
+import os
+
+def parse_rates(value):
+    """Return {parameter: samples per second} from "Parameter=rate,..."; raise ValueError on bad entries."""
+    rates = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        parameter, separator, rate = entry.partition("=")
+        if not separator or not parameter.strip():
+            raise ValueError(f"Expected Parameter=rate, got {entry.strip()!r}.")
+        parameter, rate = parameter.strip(), float(rate)
+        if not rate > 0:
+            raise ValueError(f"Sample rate of {parameter} must be positive.")
+        rates[parameter] = rate
+    return rates
+
+# Samples per second of each parameter of the simulated machine (default: one every 15 seconds).
+SIMULATOR_SAMPLE_RATE = float(os.getenv("SIMULATOR_SAMPLE_RATE", 1 / 15))
+# Per-parameter overrides from 0.1 Hz to kHz, e.g. "Temperature=0.1,DrillingSpeed=1000".
+SIMULATOR_SAMPLE_RATES = parse_rates(os.getenv("SIMULATOR_SAMPLE_RATES", ""))
+# Start parameters at random phases of their period instead of publishing them in one burst.
+SIMULATOR_SPREAD = os.getenv("SIMULATOR_SPREAD", "true").lower() in ("1", "true", "yes")
+# Delay each sample by up to this fraction of its period (0 publishes exactly on schedule).
+SIMULATOR_JITTER = float(os.getenv("SIMULATOR_JITTER", 0))
+# Seconds a parameter may fall behind before missed samples are skipped rather than sent in a burst.
+SIMULATOR_MAX_BACKLOG = float(os.getenv("SIMULATOR_MAX_BACKLOG", 1.0))
+
+def sample_rate(parameter):
+    """Return the configured sample rate of `parameter`."""
+    return SIMULATOR_SAMPLE_RATES.get(parameter, SIMULATOR_SAMPLE_RATE)
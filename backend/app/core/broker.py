@@ -2,24 +2,56 @@
 Broker configuration.
 """
 
-import os
 import paho.mqtt.client as mqtt
-from dotenv import load_dotenv
-from app.services.data_manager import get_machine_name
 
-load_dotenv("backend/app/config/.env")
-
-machine_name = get_machine_name()
+from app.config.mqtt import MQTT_BROKER, MQTT_PORT
 
 def setup_mqtt_client(client_id, on_message_callback, topics):
     """Set up and return an MQTT client configured with topics."""
-    mqtt_broker = os.getenv("MQTT_BROKER", "mqtt-broker")
-    mqtt_port = os.getenv("MQTT_PORT", "1883")
-    client = mqtt.Client(client_id=machine_name, protocol=mqtt.MQTTv5)
+    client = mqtt.Client(client_id=client_id, protocol=mqtt.MQTTv5)
     client.on_message = on_message_callback
-    client.connect(mqtt_broker, int(mqtt_port))
+    client.connect(MQTT_BROKER, MQTT_PORT)
 
     for topic in topics:
         client.subscribe(topic)
 
     return client
+
+def start_mqtt_client(client_id, on_message_callback, topics, on_status=None):
+    """
+    Return an MQTT client that connects in the background with its network loop running.
+
+    Unlike setup_mqtt_client this never blocks: paho keeps retrying until the
+    broker answers, and topics are subscribed again on every (re)connect.
+
+    :param on_status: Optional callable (connected, detail) invoked on connect, disconnect
+                      and failed connection attempts.
+    """
+    client = mqtt.Client(client_id=client_id, protocol=mqtt.MQTTv5)
+    client.on_message = on_message_callback
+
+    def on_connect(client, userdata, flags, reason_code, properties=None):  # pylint: disable=unused-argument
+        if reason_code == 0:
+            for topic in topics:
+                client.subscribe(topic)
+        if on_status is not None:
+            on_status(reason_code == 0, str(reason_code))
+
+    def on_disconnect(client, userdata, reason_code, properties=None):  # pylint: disable=unused-argument
+        if on_status is not None:
+            on_status(False, f"disconnected: {reason_code}")
+
+    def on_connect_fail(client, userdata):  # pylint: disable=unused-argument
+        if on_status is not None:
+            on_status(False, f"cannot reach {MQTT_BROKER}:{MQTT_PORT}")
+
+    client.on_connect = on_connect
+    client.on_disconnect = on_disconnect
+    client.on_connect_fail = on_connect_fail
+    client.connect_async(MQTT_BROKER, MQTT_PORT)
+    client.loop_start()
+    return client
+
+def shared_subscription(topic_filter, group):
+    """Return the MQTT v5 shared subscription of `topic_filter` for `group`; the broker hands each message to one member."""
+    return f"$share/{group}/{topic_filter}"
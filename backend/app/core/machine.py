@@ -2,61 +2,129 @@
 File contains machine logic.
 """
 
+import os
+import signal
+import socket
 import threading
-import time
 import logging
 
+from app.core.readiness import READY, UNAVAILABLE, set_status
 from app.core.state_manager import initialize_data_storage, get_data_storage
-from app.core.broker import setup_mqtt_client
+from app.core.broker import start_mqtt_client
 from app.config.database import Database
-from app.models.models import Base
-from app.services.mqtt_manager import handle_mqtt_message, publish_data
-from app.services.data_manager import MACHINE_NAME, MACHINE_PARAMETERS, TOPICS
+from app.config.mqtt import MQTT_SUBSCRIPTIONS
+from app.models.migrations import PARTITIONED, create_schema, start_partition_maintenance
+from app.config.ingestion import INGEST_WORKERS
+from app.config.roles import API, INGESTOR, ROLES, SIMULATOR
+from app.services.mqtt_manager import configure_message_handling, handle_mqtt_message, publish_data
+from app.services.data_manager import get_machine_profile
+from app.services.ingestion import start_ingestion_writer, stop_ingestion_writer
 
 logger = logging.getLogger(__name__)
 
+_client = None
+# Set to stop the publish thread of the simulator role.
+_stop_publishing = threading.Event()
+
 def setup_database():
     """Ensure that all tables are created by SQLAlchemy's metadata."""
     try:
         engine = Database.get_engine()
-        Base.metadata.create_all(bind=engine)
+        create_schema(engine)
+        if PARTITIONED:
+            start_partition_maintenance(engine)
         logger.info("All database tables created successfully.")
     except Exception as e:
         logger.error(f"Database setup failed: {e}")
         raise
 
 
-def setup_mqtt():
-    """Configure and return an MQTT client."""
-    try:
-        client = setup_mqtt_client(MACHINE_NAME, handle_mqtt_message, TOPICS)
-        return client
-    except ConnectionError as e:
-        logger.error(f"Failed to connect MQTT client: {e}")
-        raise
+def _report_mqtt_status(connected, detail):
+    if connected:
+        logger.info("MQTT client connected.")
+        set_status("mqtt", READY)
+    else:
+        logger.warning(f"MQTT broker unavailable ({detail}); retrying in the background.")
+        set_status("mqtt", UNAVAILABLE, detail)
+
+
+def setup_mqtt(client_id, topics=MQTT_SUBSCRIPTIONS):
+    """Return an MQTT client that connects, subscribes and reconnects in the background."""
+    return start_mqtt_client(client_id, handle_mqtt_message, topics, on_status=_report_mqtt_status)
+
+def _client_id(roles):
+    """Return a client ID unique to this process; the broker disconnects duplicates."""
+    name = get_machine_profile().name if SIMULATOR in roles else "-".join(sorted(roles))
+    return f"{name}-{socket.gethostname()}-{os.getpid()}"
+
+def start_machine(roles=ROLES):
+    """
+    Start this process's share of the simulator, ingestor and API roles and
+    return without waiting for the broker or the database. The schema must be
+    created separately (see setup_database); until then readings are spilled.
+
+    The API role subscribes to keep its live state current, the ingestor role
+    stores what it receives and the simulator role only publishes: readings
+    reach the database through the ingestor alone.
+    """
+    global _client  # pylint: disable=global-statement
+    store, live = INGESTOR in roles, API in roles
+    if store and INGEST_WORKERS > 0:
+        # Shared-subscription workers store readings; this process only serves live state.
+        store = False
+        logger.info(f"Storage delegated to {INGEST_WORKERS} ingestion workers.")
+    if SIMULATOR in roles:
+        profile = get_machine_profile()
+        initialize_data_storage(profile.name, profile.parameters)
+    configure_message_handling(store=store, live=live)
+    if store:
+        start_ingestion_writer()
+
+    _client = setup_mqtt(_client_id(roles), MQTT_SUBSCRIPTIONS if store or live else [])
 
-def run_machine():
-    setup_database()
-    initialize_data_storage(MACHINE_NAME, MACHINE_PARAMETERS)
+    if SIMULATOR in roles:
+        _stop_publishing.clear()
+        publish_thread = threading.Thread(
+            target=publish_data,
+            args=(profile.name, profile.parameters, _client, _stop_publishing),
+            daemon=True
+        )
+        publish_thread.start()
+    logger.info(f"Machine operations started (roles: {', '.join(sorted(roles))}).")
 
-    client = setup_mqtt()
+def stop_machine():
+    """Disconnect from the broker, flush pending readings and clear the live state."""
+    global _client  # pylint: disable=global-statement
+    logger.info("Shutting down machine...")
+    _stop_publishing.set()
+    if _client is not None:
+        _client.loop_stop()
+        _client.disconnect()
+        _client = None
+    stop_ingestion_writer()
+    get_data_storage().clear()
+    logger.info("Data storage cleared.")
 
-    publish_thread = threading.Thread(
-        target=publish_data,
-        args=(MACHINE_NAME, MACHINE_PARAMETERS, client),
-        daemon=True
-    )
-    publish_thread.start()
+def run_machine(roles=ROLES):
+    """
+    Run the simulator and ingestor roles in the foreground until interrupted
+    or terminated. The ingestor runs as INGEST_WORKERS (at least one)
+    shared-subscription worker processes, so several ingestor processes can
+    run side by side without storing a reading twice.
+    """
+    # pylint: disable=import-outside-toplevel
+    from app.services.ingest_workers import run_workers
 
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    if SIMULATOR in roles:
+        start_machine(frozenset([SIMULATOR]))
     try:
-        while True:
-            time.sleep(15)
+        if INGESTOR in roles:
+            run_workers(INGEST_WORKERS or 1)
+        else:
+            stop_event.wait()
     except KeyboardInterrupt:
         logger.info("Machine operations interrupted by user.")
     finally:
-        logger.info("Shutting down machine...")
-        if client:
-            client.loop_stop()
-            client.disconnect()
-        get_data_storage().clear()
-        logger.info("Data storage cleared.")
+        stop_machine()
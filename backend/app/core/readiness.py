@@ -0,0 +1,48 @@
+"""
+File contains readiness logic.
+
+Startup does not wait for the database or the MQTT broker. Each background
+startup step reports the state of its component here instead, and
+GET /health turns the states into a readiness answer.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+STARTING = "starting"
+READY = "ready"
+UNAVAILABLE = "unavailable"
+
+# Components that must be ready for the service to be ready.
+COMPONENTS = ("database", "mqtt")
+
+_states = {}
+_lock = threading.Lock()
+_started = time.monotonic()
+
+def set_status(component, status, detail=None):
+    """Record the state of a component; `detail` explains anything but READY."""
+    with _lock:
+        current = _states.get(component)
+        if current is not None and current["status"] == status and current["detail"] == detail:
+            return
+        _states[component] = {"status": status, "detail": detail, "since": datetime.utcnow()}
+
+def get_status():
+    """Return {"ready", "uptime_seconds", "components"} for every known component."""
+    with _lock:
+        components = {name: dict(_states.get(name) or {"status": STARTING, "detail": None, "since": None})
+                      for name in set(COMPONENTS) | set(_states)}
+    return {
+        "ready": all(components[name]["status"] == READY for name in COMPONENTS),
+        "uptime_seconds": round(time.monotonic() - _started, 3),
+        "components": components,
+    }
+
+def reset():
+    """Forget all component states, e.g. before a restart of the application."""
+    global _started  # pylint: disable=global-statement
+    with _lock:
+        _states.clear()
+        _started = time.monotonic()
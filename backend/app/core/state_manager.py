@@ -1,21 +1,63 @@
 """
 File contains data storage logic.
+
+DATA_STORAGE maps machine name -> topic -> LatestValue. Each update replaces
+an immutable record with a single dict assignment, so writers never block
+readers; DATA_LOCK is only taken when a machine is added or the storage is
+reset.
 """
 
+import itertools
 import threading
+from collections import namedtuple
+
+LatestValue = namedtuple("LatestValue", ["value", "unit", "timestamp", "sequence"])
 
 DATA_STORAGE = {}
 DATA_LOCK = threading.Lock()
 
+_sequence = itertools.count(1)
+
 def initialize_data_storage(machine_name, machine_parameters):
     """Initialize in-memory data storage."""
     with DATA_LOCK:
         DATA_STORAGE.clear()
         DATA_STORAGE[machine_name] = {
-            param_name: {"value": None, "unit": param_info["unit"]}
+            param_name: LatestValue(None, param_info["unit"], None, 0)
             for param_name, param_info in machine_parameters.items()
         }
 
 def get_data_storage():
     """Retrieve stored data."""
     return DATA_STORAGE
+
+def update_latest(machine_name, topic, value, unit, timestamp):
+    """Record the newest reading of a (machine, topic) series and return its sequence number."""
+    topics = DATA_STORAGE.get(machine_name)
+    if topics is None:
+        with DATA_LOCK:
+            topics = DATA_STORAGE.setdefault(machine_name, {})
+    sequence = next(_sequence)
+    topics[topic] = LatestValue(value, unit, timestamp, sequence)
+    return sequence
+
+def get_latest(machine_name=None, topic=None):
+    """
+    Return the latest readings as {machine: {topic: LatestValue}}.
+
+    Series that have not received a reading yet are omitted.
+    """
+    if machine_name is not None:
+        machines = {machine_name: DATA_STORAGE.get(machine_name, {})}
+    else:
+        machines = dict(DATA_STORAGE)
+
+    snapshot = {}
+    for name, topics in machines.items():
+        values = {
+            series: latest for series, latest in list(topics.items())
+            if latest.timestamp is not None and (topic is None or series == topic)
+        }
+        if values:
+            snapshot[name] = values
+    return snapshot
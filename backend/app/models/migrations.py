@@ -0,0 +1,247 @@
+"""
+File contains schema creation and migration logic.
+
+Usage:
+    python -m app.models.migrations create [--partitioned]
+    python -m app.models.migrations migrate [--partitioned] [--drop-legacy]
+
+`migrate` converts a database created with the original wide `machine_data`
+table (machine_name, topic, unit repeated on every row) into the
+dictionary-encoded layout defined in app.models.models, preserving row ids.
+"""
+
+import os
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config.database import Base, Database
+from app.models.models import MachineData, Series
+
+logger = logging.getLogger(__name__)
+
+LEGACY_TABLE = "machine_data_legacy"
+
+# Create machine_data as a PostgreSQL table range-partitioned by month on timestamp.
+PARTITIONED = os.getenv("MACHINE_DATA_PARTITIONED", "false").lower() in ("1", "true", "yes")
+# Number of future monthly partitions kept ready ahead of the current month.
+PARTITIONS_AHEAD = int(os.getenv("MACHINE_DATA_PARTITIONS_AHEAD", 2))
+# Seconds between partition checks of long-running processes.
+PARTITION_CHECK_INTERVAL = float(os.getenv("MACHINE_DATA_PARTITION_CHECK_INTERVAL", 3600))
+# pg_advisory_xact_lock key serializing partition maintenance across processes.
+PARTITION_LOCK_KEY = 0x6D645F70
+
+# Thread started by start_partition_maintenance.
+_maintenance = None
+
+PARTITIONED_DDL = """
+CREATE TABLE IF NOT EXISTS machine_data (
+    id BIGSERIAL NOT NULL,
+    series_id INTEGER NOT NULL,
+    timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp)
+"""
+
+PARTITIONED_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS ix_machine_data_series_timestamp_id ON machine_data (series_id, timestamp, id)
+"""
+
+
+def _add_months(moment, months):
+    """Return the first day of the month `months` after `moment`."""
+    month_index = moment.year * 12 + moment.month - 1 + months
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+def ensure_partitions(engine, ahead=PARTITIONS_AHEAD, start=None):
+    """
+    Create monthly partitions from `start` (default: this month) up to `ahead` months ahead.
+
+    PostgreSQL refuses to create a partition for a range the default partition
+    already holds rows of, so a missing month is created detached, filled with
+    those rows and then attached. An advisory lock serializes concurrent callers.
+    """
+    start = _add_months(start or datetime.utcnow(), 0)
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+        conn.execute(text("CREATE TABLE IF NOT EXISTS machine_data_default PARTITION OF machine_data DEFAULT"))
+        for offset in range(ahead + 1):
+            lower, upper = _add_months(start, offset), _add_months(start, offset + 1)
+            name = f"machine_data_{lower:%Y_%m}"
+            if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+                continue
+            conn.execute(text(f"CREATE TABLE {name} (LIKE machine_data INCLUDING DEFAULTS)"))
+            moved = conn.execute(text(
+                f"WITH moved AS (DELETE FROM machine_data_default "
+                f"WHERE timestamp >= :lower AND timestamp < :upper RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ), {"lower": lower, "upper": upper}).rowcount
+            conn.execute(text(
+                f"ALTER TABLE machine_data ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{lower:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+            ))
+            if moved:
+                logger.warning(f"Moved {moved} rows from machine_data_default into the new partition {name}.")
+
+
+def start_partition_maintenance(engine, interval=PARTITION_CHECK_INTERVAL):
+    """
+    Run ensure_partitions every `interval` seconds in a daemon thread, so
+    partitions stay PARTITIONS_AHEAD months ahead however long the process runs.
+    Only the first call starts a thread.
+    """
+    global _maintenance  # pylint: disable=global-statement
+    if _maintenance is not None:
+        return _maintenance
+
+    def maintain():
+        while True:
+            time.sleep(interval)
+            try:
+                ensure_partitions(engine)
+            except SQLAlchemyError as e:
+                logger.error(f"Partition maintenance failed, retrying in {interval}s: {e}")
+
+    _maintenance = threading.Thread(target=maintain, name="partition-maintenance", daemon=True)
+    _maintenance.start()
+    return _maintenance
+
+
+class LegacySchemaError(RuntimeError):
+    """The database still holds the wide machine_data table and must be migrated first."""
+
+
+def has_legacy_machine_data(engine):
+    """Whether machine_data is still the original wide table."""
+    inspector = inspect(engine)
+    return inspector.has_table("machine_data") and \
+        "machine_name" in {column["name"] for column in inspector.get_columns("machine_data")}
+
+
+def create_schema(engine, partitioned=PARTITIONED):
+    """
+    Create all tables, optionally with a time-partitioned machine_data on PostgreSQL.
+
+    :raises LegacySchemaError: If machine_data still has the wide legacy layout; create_all
+                               would skip it and every write would fail.
+    """
+    if has_legacy_machine_data(engine):
+        raise LegacySchemaError(
+            "machine_data still has the legacy wide layout; convert it with "
+            "'python -m app.models.migrations migrate' before starting the backend."
+        )
+    if partitioned:
+        if engine.dialect.name != "postgresql":
+            raise RuntimeError("Partitioned machine_data requires PostgreSQL.")
+        with engine.begin() as conn:
+            conn.execute(text(PARTITIONED_DDL))
+            conn.execute(text(PARTITIONED_INDEX_DDL))
+        ensure_partitions(engine)
+    # Tables that already exist, including a partitioned machine_data, are left untouched.
+    Base.metadata.create_all(bind=engine)
+    Series.clear_cache()
+
+
+def _rename_legacy_table(engine):
+    """Move the wide table and its PostgreSQL-owned objects out of the way of the new schema."""
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE machine_data RENAME TO {LEGACY_TABLE}"))
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(f"ALTER TABLE {LEGACY_TABLE} RENAME CONSTRAINT machine_data_pkey TO {LEGACY_TABLE}_pkey"))
+            conn.execute(text(f"ALTER SEQUENCE IF EXISTS machine_data_id_seq RENAME TO {LEGACY_TABLE}_id_seq"))
+            for index in inspect(conn).get_indexes(LEGACY_TABLE):
+                conn.execute(text(f'ALTER INDEX "{index["name"]}" RENAME TO "legacy_{index["name"]}"'))
+        else:
+            for index in inspect(conn).get_indexes(LEGACY_TABLE):
+                conn.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+
+
+def migrate_legacy_machine_data(engine, partitioned=PARTITIONED, chunk_size=100000, drop_legacy=False):
+    """
+    Convert the wide machine_data table into the dictionary-encoded schema.
+
+    Rows are copied in id ranges of `chunk_size`, each in its own transaction,
+    so the migration can run against a large table without one huge statement.
+    """
+    if has_legacy_machine_data(engine):
+        logger.info(f"Renaming wide machine_data table to {LEGACY_TABLE}...")
+        _rename_legacy_table(engine)
+    elif not inspect(engine).has_table(LEGACY_TABLE):
+        logger.info("No legacy machine_data table found; creating schema only.")
+        create_schema(engine, partitioned)
+        return 0
+
+    create_schema(engine, partitioned)
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"INSERT INTO machines (name) SELECT DISTINCT l.machine_name FROM {LEGACY_TABLE} l "
+            "WHERE NOT EXISTS (SELECT 1 FROM machines m WHERE m.name = l.machine_name)"
+        ))
+        conn.execute(text(
+            f"INSERT INTO series (machine_id, topic, unit) "
+            f"SELECT m.id, l.topic, MAX(l.unit) FROM {LEGACY_TABLE} l JOIN machines m ON m.name = l.machine_name "
+            "WHERE NOT EXISTS (SELECT 1 FROM series s WHERE s.machine_id = m.id AND s.topic = l.topic) "
+            "GROUP BY m.id, l.topic"
+        ))
+        low, high = conn.execute(text(f"SELECT MIN(id), MAX(id) FROM {LEGACY_TABLE}")).one()
+
+    copied = 0
+    if low is not None:
+        copy_chunk = text(
+            f"INSERT INTO {MachineData.__tablename__} (id, series_id, timestamp, value) "
+            f"SELECT l.id, s.id, COALESCE(l.timestamp, CURRENT_TIMESTAMP), l.value FROM {LEGACY_TABLE} l "
+            "JOIN machines m ON m.name = l.machine_name "
+            "JOIN series s ON s.machine_id = m.id AND s.topic = l.topic "
+            "WHERE l.id >= :low AND l.id < :high"
+        )
+        for chunk_start in range(low, high + 1, chunk_size):
+            with engine.begin() as conn:
+                copied += conn.execute(copy_chunk, {"low": chunk_start, "high": chunk_start + chunk_size}).rowcount
+            logger.info(f"Migrated {copied} rows (up to id {min(chunk_start + chunk_size - 1, high)}).")
+
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "SELECT setval(pg_get_serial_sequence('machine_data', 'id'), "
+                    "(SELECT MAX(id) FROM machine_data))"
+                ))
+
+    if drop_legacy:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+        logger.info(f"Dropped {LEGACY_TABLE}.")
+
+    logger.info(f"Migration finished: {copied} rows copied.")
+    return copied
+
+
+def main():
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Create or migrate the machine data schema.")
+    parser.add_argument("command", choices=["create", "migrate"])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--partitioned", action="store_true", default=PARTITIONED,
+                        help="Range-partition machine_data by month (PostgreSQL only).")
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--drop-legacy", action="store_true",
+                        help="Drop the wide legacy table once its rows have been copied.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    Database.initialize(args.database_url)
+    engine = Database.get_engine()
+    if args.command == "create":
+        create_schema(engine, args.partitioned)
+    else:
+        migrate_legacy_machine_data(engine, args.partitioned, args.chunk_size, args.drop_legacy)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,478 @@
 """
 File defining database schema.
+
+Readings are stored narrowly: `machine_data` only holds (id, series_id,
+timestamp, value). Machine names, topics and units live once in the small
+`machines` and `series` dictionary tables and are resolved through an
+in-process cache, so hot paths never repeat those strings per row.
 """
 
-from sqlalchemy import Column, Integer, String, Float, TIMESTAMP
+import csv
+import io
+import threading
+from sqlalchemy import (
+    BigInteger, Column, Float, ForeignKey, Index, Integer, String, TIMESTAMP, UniqueConstraint,
+    case, delete, func, insert, select, tuple_, union_all,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timedelta
 from app.config.database import Base
 
+# (machine_name, topic) -> (series_id, unit); series rows are never deleted.
+_series_cache = {}
+_series_lock = threading.Lock()
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _dialect_insert(session: Session, table):
+    """Return an INSERT for `table` supporting ON CONFLICT clauses on the session's dialect."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Upserts are not supported on '{dialect}'.")
+
+
+def _insert_ignore(session: Session, table):
+    """Return an INSERT for `table` that skips rows violating a unique constraint."""
+    return _dialect_insert(session, table).on_conflict_do_nothing()
+
+
+class Machine(Base):
+    __tablename__ = "machines"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+
+
+class Series(Base):
+    __tablename__ = "series"
+
+    id = Column(Integer, primary_key=True)
+    machine_id = Column(Integer, ForeignKey("machines.id"), nullable=False)
+    topic = Column(String, nullable=False)
+    unit = Column(String)
+
+    __table_args__ = (
+        UniqueConstraint("machine_id", "topic", name="uq_series_machine_topic"),
+    )
+
+    @classmethod
+    def get_or_create_id(cls, session: Session, machine_name: str, topic: str, unit: str = None):
+        """
+        Return the series id for (machine_name, topic), registering it on first use.
+
+        Registration runs in its own transaction so a later rollback of the
+        caller's session cannot leave a cached id pointing at nothing.
+        """
+        cached = _series_cache.get((machine_name, topic))
+        if cached is not None:
+            return cached[0]
+
+        with _series_lock:
+            cached = _series_cache.get((machine_name, topic))
+            if cached is None:
+                with session.get_bind().engine.begin() as conn:
+                    conn.execute(_insert_ignore(session, Machine.__table__).values(name=machine_name))
+                    machine_id = conn.execute(
+                        select(Machine.id).where(Machine.name == machine_name)
+                    ).scalar_one()
+                    conn.execute(_insert_ignore(session, cls.__table__).values(
+                        machine_id=machine_id, topic=topic, unit=unit
+                    ))
+                    series_id, unit = conn.execute(
+                        select(cls.id, cls.unit).where(cls.machine_id == machine_id, cls.topic == topic)
+                    ).one()
+                cached = _series_cache[(machine_name, topic)] = (series_id, unit)
+        return cached[0]
+
+    @classmethod
+    def for_machine(cls, session: Session, machine_name: str, topic: str = None):
+        """Return {series_id: (topic, unit)} for a machine, optionally limited to one topic."""
+        query = (
+            select(cls.id, cls.topic, cls.unit)
+            .join(Machine, Machine.id == cls.machine_id)
+            .where(Machine.name == machine_name)
+        )
+        if topic is not None:
+            query = query.where(cls.topic == topic)
+        return {series_id: (series_topic, unit) for series_id, series_topic, unit in session.execute(query)}
+
+    @classmethod
+    def clear_cache(cls):
+        """Forget cached series ids, e.g. after the schema has been recreated."""
+        with _series_lock:
+            _series_cache.clear()
+
+
 class MachineData(Base):
     __tablename__ = "machine_data"
 
-    id = Column(Integer, primary_key=True, index=True)
-    machine_name = Column(String, index=True, nullable=False)
-    topic = Column(String, index=True, nullable=False)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    # Not declared as a foreign key: the check would cost an extra lookup per inserted row.
+    series_id = Column(Integer, nullable=False)
+    timestamp = Column(TIMESTAMP, nullable=False, default=datetime.utcnow)
     value = Column(Float, nullable=False)
-    unit = Column(String)
-    timestamp = Column(TIMESTAMP, default=datetime.utcnow)
+
+    # The only index on the table: per-series time-range scans and keyset pagination.
+    __table_args__ = (
+        Index("ix_machine_data_series_timestamp_id", "series_id", "timestamp", "id"),
+    )
+
+    # Column order of the row tuples accepted by bulk_create.
+    BULK_COLUMNS = ("machine_name", "topic", "value", "unit", "timestamp")
+    # Column order written to the table by bulk_create.
+    STORED_COLUMNS = ("series_id", "timestamp", "value")
 
     @classmethod
-    def create_entry(cls, session: Session, machine_name: str, topic: str, value: float, unit: str):
-        entry = cls(machine_name=machine_name, topic=topic, value=value, unit=unit)
+    def create_entry(cls, session: Session, machine_name: str, topic: str, value: float, unit: str,
+                     timestamp=None):
+        series_id = Series.get_or_create_id(session, machine_name, topic, unit)
+        entry = cls(series_id=series_id, value=value, timestamp=timestamp or datetime.utcnow())
         session.add(entry)
+        apply_rollups(session, [(series_id, entry.timestamp, value)])
         session.commit()
         session.refresh(entry)
         return entry
 
+    @classmethod
+    def bulk_create(cls, session: Session, rows):
+        """
+        Insert many readings in a single round trip and commit.
+
+        :param rows: Sequence of (machine_name, topic, value, unit, timestamp) tuples.
+        """
+        if not rows:
+            return 0
+        stored = [
+            (Series.get_or_create_id(session, machine_name, topic, unit), timestamp, value)
+            for machine_name, topic, value, unit, timestamp in rows
+        ]
+        if session.get_bind().dialect.name == "postgresql":
+            cls._copy_rows(session, stored)
+        else:
+            session.execute(insert(cls), [dict(zip(cls.STORED_COLUMNS, row)) for row in stored])
+        apply_rollups(session, stored)
+        session.commit()
+        return len(rows)
+
+    @classmethod
+    def _copy_rows(cls, session: Session, rows):
+        """
+        Stream (series_id, timestamp, value) rows into the table with PostgreSQL COPY.
+
+        :raises DBAPIError: Driver errors, wrapped like SQLAlchemy wraps those of executed statements.
+        """
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        columns = ", ".join(cls.STORED_COLUMNS)
+        statement = f"COPY {cls.__tablename__} ({columns}) FROM STDIN WITH (FORMAT csv)"
+        dbapi = session.get_bind().dialect.dbapi
+        cursor = session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(statement, buffer)
+        except dbapi.Error as e:
+            raise DBAPIError.instance(statement, None, e, dbapi.Error) from e
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def to_dict(row, machine_name, topic, unit):
+        """Render an (id, timestamp, value) row together with its series attributes."""
+        return {
+            "id": row[0],
+            "machine_name": machine_name,
+            "topic": topic,
+            "value": row[2],
+            "unit": unit,
+            "timestamp": row[1],
+        }
+
     @classmethod
     def get_all_entries(cls, session: Session, machine_name: str):
         """Retrieve all entries for a specific machine."""
-        return session.query(cls).filter(cls.machine_name == machine_name).all()
+        series = Series.for_machine(session, machine_name)
+        if not series:
+            return []
+        query = (
+            select(cls.id, cls.timestamp, cls.value, cls.series_id)
+            .where(cls.series_id.in_(series))
+            .order_by(cls.timestamp, cls.id)
+        )
+        return [cls.to_dict(row, machine_name, *series[row[3]]) for row in session.execute(query)]
+
+    @classmethod
+    def get_entries_page(cls, session: Session, machine_name: str, start=None, end=None,
+                         topic=None, limit=1000, after=None):
+        """
+        Retrieve one page of entries for a machine ordered by (timestamp, id).
+
+        :return: Tuple of (entries, has_more).
+        """
+        rows, series, has_more = cls.get_rows_page(session, machine_name, start, end, topic, limit, after)
+        return [cls.to_dict(row, machine_name, *series[row[3]]) for row in rows], has_more
+
+    @classmethod
+    def get_rows_page(cls, session: Session, machine_name: str, start=None, end=None,
+                      topic=None, limit=1000, after=None, since=None, since_id=None, descending=False):
+        """
+        Retrieve one page of raw (id, timestamp, value, series_id) rows for a
+        machine ordered by (timestamp, id), or newest first when `descending`.
+
+        Each series is read with its own bounded index range scan and the
+        per-series pages are merged, so the cost does not grow with history.
+
+        :param start: Inclusive lower timestamp bound.
+        :param end: Exclusive upper timestamp bound.
+        :param topic: Restrict results to a single topic.
+        :param limit: Maximum number of rows to return.
+        :param after: (timestamp, id) of the last row of the previous page.
+        :param since: Only rows with a timestamp later than this.
+        :param since_id: Only rows with an id greater than this. Ids are assigned on insert, not
+                         on commit, so with several writers (ingestion workers, spill replay)
+                         a lower id can become visible later; pollers should pass an id some
+                         way behind the highest they hold and skip the rows they already have.
+        :param descending: Return the newest rows first; `after` then continues towards older rows.
+        :return: Tuple of (rows, {series_id: (topic, unit)}, has_more).
+        """
+        series = Series.for_machine(session, machine_name, topic)
+        if not series:
+            return [], series, False
+
+        def ordered(timestamp, entry_id):
+            return (timestamp.desc(), entry_id.desc()) if descending else (timestamp, entry_id)
+
+        per_series = []
+        for series_id in series:
+            query = select(cls.id, cls.timestamp, cls.value, cls.series_id).where(cls.series_id == series_id)
+            if start is not None:
+                query = query.where(cls.timestamp >= start)
+            if end is not None:
+                query = query.where(cls.timestamp < end)
+            if after is not None:
+                position = tuple_(cls.timestamp, cls.id)
+                query = query.where(position < tuple_(*after) if descending else position > tuple_(*after))
+            if since is not None:
+                query = query.where(cls.timestamp > since)
+            if since_id is not None:
+                query = query.where(cls.id > since_id)
+            query = query.order_by(*ordered(cls.timestamp, cls.id)).limit(limit + 1).subquery()
+            per_series.append(select(query))
+
+        merged = union_all(*per_series).subquery()
+        query = select(merged).order_by(*ordered(merged.c.timestamp, merged.c.id)).limit(limit + 1)
+        rows = session.execute(query).all()
+        return rows[:limit], series, len(rows) > limit
+
+    @classmethod
+    def iter_entry_rows(cls, session: Session, series_ids, start=None, end=None, chunk_size=10000):
+        """
+        Stream raw (id, timestamp, value, series_id) rows of some series in chunks.
+
+        Rows come series by series in (timestamp, id) order, straight off the
+        series index, through a server-side cursor, so memory use does not
+        depend on how many rows match.
+
+        :param start: Inclusive lower timestamp bound.
+        :param end: Exclusive upper timestamp bound.
+        :return: Iterator of lists of at most `chunk_size` rows.
+        """
+        for series_id in series_ids:
+            query = select(cls.id, cls.timestamp, cls.value, cls.series_id).where(cls.series_id == series_id)
+            if start is not None:
+                query = query.where(cls.timestamp >= start)
+            if end is not None:
+                query = query.where(cls.timestamp < end)
+            query = query.order_by(cls.timestamp, cls.id)
+            result = session.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+            try:
+                for partition in result.partitions():
+                    yield partition
+            finally:
+                result.close()
 
     @classmethod
     def delete_entry(cls, session: Session, entry_id: int):
-        """Delete an entry by ID."""
+        """Delete an entry by ID and recompute the rollup buckets it was part of, in one transaction."""
         entry = session.query(cls).filter(cls.id == entry_id).first()
         if entry:
+            series_id, timestamp = entry.series_id, entry.timestamp
             session.delete(entry)
+            session.flush()
+            cls.refresh_rollups(session, series_id, timestamp)
             session.commit()
         else:
             raise ValueError("Entry not found")
+
+    @classmethod
+    def refresh_rollups(cls, session: Session, series_id, timestamp):
+        """
+        Recompute the rollup buckets of one series that contain `timestamp`:
+        the finest from raw rows, every coarser one from the finer rollup.
+        Buckets left without readings are deleted.
+        """
+        finest = ROLLUPS[0]
+        start = finest.bucket_start(timestamp)
+        rows = session.execute(
+            select(cls.series_id, cls.timestamp, cls.value)
+            .where(cls.series_id == series_id)
+            .where(cls.timestamp >= start)
+            .where(cls.timestamp < start + timedelta(seconds=finest.RESOLUTION))
+        ).all()
+        finest.replace_bucket(session, series_id, start, finest.aggregate(rows))
+
+        for finer, rollup in zip(ROLLUPS, ROLLUPS[1:]):
+            start = rollup.bucket_start(timestamp)
+            rows = session.execute(
+                select(finer.bucket, finer.min_value, finer.max_value, finer.sum_value, finer.sample_count,
+                       finer.last_value, finer.last_timestamp)
+                .where(finer.series_id == series_id)
+                .where(finer.bucket >= start)
+                .where(finer.bucket < start + timedelta(seconds=rollup.RESOLUTION))
+            ).all()
+            rollup.replace_bucket(session, series_id, start,
+                                  rollup.coarsen({(series_id, row[0]): list(row[1:]) for row in rows}))
+
+
+class RollupMixin:
+    """
+    Per-series aggregates of machine_data over fixed `RESOLUTION`-second buckets.
+
+    Rows are merged incrementally whenever readings are written, so every
+    bucket always reflects all raw readings committed for it.
+    """
+
+    RESOLUTION = None
+
+    series_id = Column(Integer, primary_key=True)
+    bucket = Column(TIMESTAMP, primary_key=True)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    sum_value = Column(Float, nullable=False)
+    sample_count = Column(BigInteger, nullable=False)
+    last_value = Column(Float, nullable=False)
+    last_timestamp = Column(TIMESTAMP, nullable=False)
+
+    @classmethod
+    def bucket_start(cls, timestamp):
+        """Return the start of the bucket containing `timestamp`."""
+        delta = timestamp - EPOCH
+        seconds = delta.days * 86400 + delta.seconds
+        return EPOCH + timedelta(seconds=seconds - seconds % cls.RESOLUTION)
+
+    @classmethod
+    def aggregate(cls, rows):
+        """
+        Fold (series_id, timestamp, value) rows into this resolution's buckets.
+
+        :return: {(series_id, bucket): [min, max, sum, count, last_value, last_timestamp]}
+        """
+        aggregates = {}
+        for series_id, timestamp, value in rows:
+            key = (series_id, cls.bucket_start(timestamp))
+            current = aggregates.get(key)
+            if current is None:
+                aggregates[key] = [value, value, value, 1, value, timestamp]
+                continue
+            if value < current[0]:
+                current[0] = value
+            if value > current[1]:
+                current[1] = value
+            current[2] += value
+            current[3] += 1
+            if timestamp >= current[5]:
+                current[4], current[5] = value, timestamp
+        return aggregates
+
+    @classmethod
+    def coarsen(cls, aggregates):
+        """Fold aggregates of a finer resolution (as returned by `aggregate`) into this one."""
+        coarse = {}
+        for (series_id, bucket), (low, high, total, count, last, last_ts) in aggregates.items():
+            key = (series_id, cls.bucket_start(bucket))
+            current = coarse.get(key)
+            if current is None:
+                coarse[key] = [low, high, total, count, last, last_ts]
+                continue
+            current[0] = min(current[0], low)
+            current[1] = max(current[1], high)
+            current[2] += total
+            current[3] += count
+            if last_ts >= current[5]:
+                current[4], current[5] = last, last_ts
+        return coarse
+
+    @classmethod
+    def replace_bucket(cls, session: Session, series_id, bucket, aggregates):
+        """Overwrite one bucket with its entry in `aggregates`, or delete it when there is none."""
+        if (series_id, bucket) in aggregates:
+            cls.merge(session, {(series_id, bucket): aggregates[(series_id, bucket)]}, replace=True)
+        else:
+            session.execute(delete(cls).where(cls.series_id == series_id).where(cls.bucket == bucket))
+
+    @classmethod
+    def merge(cls, session: Session, aggregates, replace=False):
+        """
+        Upsert aggregates into the rollup table within the session's transaction.
+
+        :param replace: Overwrite existing buckets instead of combining with them (used by backfills).
+        """
+        if not aggregates:
+            return
+        stmt = _dialect_insert(session, cls.__table__)
+        if replace:
+            updates = {column: getattr(stmt.excluded, column) for column in
+                       ("min_value", "max_value", "sum_value", "sample_count", "last_value", "last_timestamp")}
+        else:
+            table = cls.__table__.c
+            least, greatest = (func.least, func.greatest) \
+                if session.get_bind().dialect.name == "postgresql" else (func.min, func.max)
+            updates = {
+                "min_value": least(table.min_value, stmt.excluded.min_value),
+                "max_value": greatest(table.max_value, stmt.excluded.max_value),
+                "sum_value": table.sum_value + stmt.excluded.sum_value,
+                "sample_count": table.sample_count + stmt.excluded.sample_count,
+                "last_value": case(
+                    (stmt.excluded.last_timestamp >= table.last_timestamp, stmt.excluded.last_value),
+                    else_=table.last_value,
+                ),
+                "last_timestamp": greatest(table.last_timestamp, stmt.excluded.last_timestamp),
+            }
+        stmt = stmt.on_conflict_do_update(index_elements=["series_id", "bucket"], set_=updates)
+        # Sorted keys give concurrent writers a consistent lock order.
+        session.execute(stmt, [
+            {
+                "series_id": series_id, "bucket": bucket,
+                "min_value": low, "max_value": high, "sum_value": total, "sample_count": count,
+                "last_value": last, "last_timestamp": last_ts,
+            }
+            for (series_id, bucket), (low, high, total, count, last, last_ts) in sorted(aggregates.items())
+        ])
+
+
+class MachineDataRollup1m(RollupMixin, Base):
+    __tablename__ = "machine_data_rollup_1m"
+    RESOLUTION = 60
+
+
+class MachineDataRollup1h(RollupMixin, Base):
+    __tablename__ = "machine_data_rollup_1h"
+    RESOLUTION = 3600
+
+
+# Finest first; each resolution must be a multiple of the previous one.
+ROLLUPS = (MachineDataRollup1m, MachineDataRollup1h)
+
+
+def apply_rollups(session: Session, rows):
+    """Merge freshly written (series_id, timestamp, value) rows into every rollup table."""
+    aggregates = None
+    for rollup in ROLLUPS:
+        aggregates = rollup.aggregate(rows) if aggregates is None else rollup.coarsen(aggregates)
+        rollup.merge(session, aggregates)
@@ -0,0 +1,246 @@
+"""
+File contains aggregation and downsampling logic for machine data.
+
+Both helpers bound their output, and downsampling also its memory, by the
+requested resolution or point budget rather than by the number of stored rows.
+"""
+
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import Float, Integer, case, cast, func, literal_column, select
+from sqlalchemy.orm import Session
+
+from app.models.models import ROLLUPS, MachineData, Series
+from app.services.payload import to_micros
+
+EPOCH = datetime(1970, 1, 1)
+# Readings of one topic LTTB runs on directly; more are pre-reduced per time bucket first.
+DOWNSAMPLE_MAX_ROWS = 100000
+# Pre-reduction buckets per requested point; each keeps at most two readings.
+DOWNSAMPLE_BUCKETS_PER_POINT = 2
+# Rows fetched per round trip while downsampling.
+DOWNSAMPLE_CHUNK_SIZE = 10000
+
+
+def epoch_seconds(session: Session, column):
+    """Return a SQL expression converting a timestamp column to UTC epoch seconds."""
+    if session.get_bind().dialect.name == "sqlite":
+        # Whole seconds plus the millisecond fraction; julianday() arithmetic is not exact at bucket edges.
+        seconds = cast(func.strftime("%s", column), Float)
+        return seconds + cast(func.strftime("%f", column), Float) - cast(func.strftime("%S", column), Float)
+    return cast(func.extract("epoch", column), Float)
+
+
+def bucket_index(session: Session, column, resolution):
+    """Return a SQL expression numbering `resolution`-second buckets since the epoch."""
+    seconds = epoch_seconds(session, column) / resolution
+    if session.get_bind().dialect.name == "sqlite":
+        # SQLite lacks floor() without math extensions; epochs are positive so truncation matches.
+        return cast(seconds, Integer)
+    return func.floor(seconds)
+
+
+def pick_rollup(resolution):
+    """Return the coarsest rollup whose buckets evenly tile `resolution`, or None to use raw rows."""
+    for rollup in reversed(ROLLUPS):
+        ratio = resolution / rollup.RESOLUTION
+        if ratio >= 1 and ratio == int(ratio):
+            return rollup
+    return None
+
+
+def bucket_query(session: Session, start, end, resolution, series_ids=None, rollup=None):
+    """
+    Build a query aggregating readings into `resolution`-second buckets.
+
+    Reads raw machine_data rows, or pre-aggregated rows of `rollup` when given.
+    Rows are (series_id, bucket_index, min, max, sum, count, last, last_timestamp).
+    """
+    if rollup is None:
+        source = MachineData
+        time_column = MachineData.timestamp
+        columns = (MachineData.value, MachineData.value, MachineData.value, literal_column("1"),
+                   MachineData.value, MachineData.timestamp)
+        newest_first = (MachineData.timestamp.desc(), MachineData.id.desc())
+    else:
+        source = rollup
+        time_column = rollup.bucket
+        columns = (rollup.min_value, rollup.max_value, rollup.sum_value, rollup.sample_count,
+                   rollup.last_value, rollup.last_timestamp)
+        newest_first = (rollup.last_timestamp.desc(),)
+        start = rollup.bucket_start(start)
+
+    bucket = bucket_index(session, time_column, resolution)
+    ranked = select(
+        source.series_id,
+        bucket.label("bucket"),
+        *(column.label(name) for column, name in zip(columns, ("low", "high", "total", "samples", "last", "last_ts"))),
+        func.row_number().over(partition_by=(source.series_id, bucket), order_by=newest_first).label("rank"),
+    ).where(time_column >= start).where(time_column < end)
+    if series_ids is not None:
+        ranked = ranked.where(source.series_id.in_(series_ids))
+    ranked = ranked.subquery()
+
+    return (
+        select(
+            ranked.c.series_id,
+            ranked.c.bucket,
+            func.min(ranked.c.low),
+            func.max(ranked.c.high),
+            func.sum(ranked.c.total),
+            func.sum(ranked.c.samples),
+            func.max(case((ranked.c.rank == 1, ranked.c.last))),
+            func.max(ranked.c.last_ts),
+        )
+        .group_by(ranked.c.series_id, ranked.c.bucket)
+        .order_by(ranked.c.series_id, ranked.c.bucket)
+    )
+
+
+def _window_parts(start, end, rollup):
+    """
+    Split [start, end) into (start, end, rollup) parts: whole rollup buckets are
+    read from `rollup`, the partial buckets at either edge from raw rows.
+    """
+    if rollup is None:
+        return [(start, end, None)]
+    inner_start = rollup.bucket_start(start)
+    if inner_start < start:
+        inner_start += timedelta(seconds=rollup.RESOLUTION)
+    inner_end = rollup.bucket_start(end)
+    if inner_start >= inner_end:
+        return [(start, end, None)]
+    parts = [(start, inner_start, None), (inner_start, inner_end, rollup), (inner_end, end, None)]
+    return [part for part in parts if part[0] < part[1]]
+
+
+def aggregate_buckets(session: Session, machine_name, start, end, resolution, topic=None):
+    """
+    Aggregate readings into fixed-width time buckets per topic.
+
+    Whole buckets of the coarsest rollup table that tiles the resolution are
+    read from that rollup; partial buckets at the edges of the window and
+    resolutions no rollup tiles are aggregated from raw rows, so only readings
+    in [start, end) are counted.
+
+    :param resolution: Bucket width in seconds.
+    :return: Dict mapping topic to {"unit", "buckets"}, buckets ordered by start time.
+    """
+    series = Series.for_machine(session, machine_name, topic)
+    if not series:
+        return {}
+
+    # (series_id, bucket) -> [min, max, sum, count, last, last_timestamp], combined over the parts.
+    combined = {}
+    for part_start, part_end, rollup in _window_parts(start, end, pick_rollup(resolution)):
+        query = bucket_query(session, part_start, part_end, resolution, series_ids=series, rollup=rollup)
+        for series_id, row_bucket, low, high, total, count, last, last_ts in session.execute(query):
+            key = (series_id, int(row_bucket))
+            current = combined.get(key)
+            if current is None:
+                combined[key] = [low, high, total, count, last, last_ts]
+                continue
+            current[0] = min(current[0], low)
+            current[1] = max(current[1], high)
+            current[2] += total
+            current[3] += count
+            if last_ts >= current[5]:
+                current[4], current[5] = last, last_ts
+
+    result = {}
+    for (series_id, row_bucket), (low, high, total, count, last, _) in sorted(combined.items()):
+        series_topic, unit = series[series_id]
+        entry = result.setdefault(series_topic, {"unit": unit, "buckets": []})
+        entry["buckets"].append({
+            "start": EPOCH + timedelta(seconds=row_bucket * resolution),
+            "min": low,
+            "max": high,
+            "avg": total / count,
+            "count": count,
+            "last": last,
+        })
+    return result
+
+
+def lttb(x, y, threshold):
+    """
+    Downsample a series with Largest-Triangle-Three-Buckets.
+
+    :param x: Monotonic NumPy array of x coordinates.
+    :param y: NumPy array of values, same length as x.
+    :param threshold: Number of points to keep (at least 3).
+    :return: Indices of the selected points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 buckets over the interior points; first and last are always kept.
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    anchor = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[edges[i + 1]:edges[i + 2]].mean()
+            next_y = y[edges[i + 1]:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+
+        ax, ay = x[anchor], y[anchor]
+        areas = np.abs((ax - next_x) * (y[start:end] - ay) - (ax - x[start:end]) * (next_y - ay))
+        anchor = start + int(np.argmax(areas))
+        selected[i + 1] = anchor
+
+    return selected
+
+
+def minmax_indices(x, y, start, width):
+    """
+    Return the sorted indices of the lowest and highest point of every `width`-wide
+    bucket from `start` on, plus the first and last point, of time-ordered x and y.
+    """
+    buckets = (x - start) // width
+    order = np.lexsort((y, buckets))
+    ordered = buckets[order]
+    first = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    last = np.r_[first[1:] - 1, len(order) - 1]
+    return np.unique(np.concatenate((order[first], order[last], [0, len(x) - 1])))
+
+
+def downsample_points(session: Session, machine_name, start, end, points, topic=None):
+    """
+    Return at most `points` representative readings per topic using LTTB.
+
+    Readings are streamed in chunks. Once more than DOWNSAMPLE_MAX_ROWS of a
+    topic are held, they are reduced to the lowest and highest reading of each
+    of `points * DOWNSAMPLE_BUCKETS_PER_POINT` equal time buckets before LTTB
+    runs (MinMaxLTTB), so memory is bounded by the point budget, not the window.
+
+    :return: Dict mapping topic to {"unit", "points"}.
+    """
+    series = Series.for_machine(session, machine_name, topic)
+    start_us = to_micros(start)
+    width = max(1, -(-(to_micros(end) - start_us) // (points * DOWNSAMPLE_BUCKETS_PER_POINT)))
+    result = {}
+    for series_id, (series_topic, unit) in series.items():
+        x = np.empty(0, dtype=np.int64)
+        y = np.empty(0, dtype=np.float64)
+        for chunk in MachineData.iter_entry_rows(session, [series_id], start, end, chunk_size=DOWNSAMPLE_CHUNK_SIZE):
+            _, timestamps, values, _ = zip(*chunk)
+            x = np.concatenate((x, np.array(timestamps, dtype="datetime64[us]").astype(np.int64)))
+            y = np.concatenate((y, np.array(values, dtype=np.float64)))
+            if len(x) > DOWNSAMPLE_MAX_ROWS:
+                keep = minmax_indices(x, y, start_us, width)
+                x, y = x[keep], y[keep]
+        if not len(x):
+            continue
+        indices = lttb(x / 1e6, y, points)
+        result[series_topic] = {
+            "unit": unit,
+            "points": [{"timestamp": EPOCH + timedelta(microseconds=int(x[i])), "value": float(y[i])} for i in indices],
+        }
+    return result
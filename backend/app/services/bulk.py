@@ -0,0 +1,157 @@
+"""
+File contains bulk upload parsing and validation logic.
+
+Edge gateways upload buffered readings in one request, as any of
+
+    JSON array      [{"machine_name": ..., "topic": ..., "value": ..., "unit": ..., "timestamp": ...}, ...]
+    NDJSON          one such object per line (Content-Type: application/x-ndjson)
+    compact JSON    {"machine_name": [...], "topic": [...], "value": [...], "unit": [...], "timestamp": [...]}
+
+In the compact form a field may also be a single value shared by every
+reading, e.g. {"machine_name": "press-1", "topic": [...], "value": [...]}.
+`unit` is optional; a missing `timestamp` means the time of upload.
+Timestamps are ISO 8601 strings (naive ones are UTC) or Unix epoch seconds.
+
+Validation works on whole columns with numpy and reports every rejected
+reading by index instead of failing the upload.
+"""
+
+import json
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+FIELDS = ("machine_name", "topic", "value", "unit", "timestamp")
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+def parse_readings(body: bytes, content_type: str = "application/json"):
+    """
+    Parse an upload into columns.
+
+    :return: Tuple of (row count, {field: list of values}).
+    :raises ValueError: If the body is not one of the accepted layouts.
+    """
+    try:
+        if content_type.split(";")[0].strip().lower() in NDJSON_TYPES:
+            document = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            document = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Body is not valid JSON: {e}") from e
+
+    if isinstance(document, dict):
+        lengths = {len(column) for column in document.values() if isinstance(column, list)}
+        if len(lengths) != 1:
+            raise ValueError("Compact uploads need at least one list field, and all list fields of equal length.")
+        count = lengths.pop()
+        columns = {
+            field: document[field] if isinstance(document.get(field), list) else [document.get(field)] * count
+            for field in FIELDS
+        }
+        return count, columns
+
+    if isinstance(document, list):
+        if not all(isinstance(reading, dict) for reading in document):
+            raise ValueError("Every reading must be a JSON object.")
+        return len(document), {field: [reading.get(field) for reading in document] for field in FIELDS}
+
+    raise ValueError("Body must be a JSON array, a JSON object of columns or NDJSON.")
+
+
+def _string_mask(column):
+    return np.fromiter((isinstance(item, str) and item != "" for item in column), dtype=bool, count=len(column))
+
+
+def _as_float(item):
+    """Return a JSON number as a float, or nan for integers beyond the float range."""
+    try:
+        return float(item)
+    except OverflowError:
+        return np.nan
+
+
+def _parse_timestamps(column, now):
+    """Return (datetime64[us] array, valid mask) for a timestamp column."""
+    count = len(column)
+    parsed = np.full(count, np.datetime64(now, "us"))
+    valid = np.ones(count, dtype=bool)
+
+    kinds = np.fromiter(
+        (0 if item is None else 1 if isinstance(item, str) else
+         2 if isinstance(item, (int, float)) and not isinstance(item, bool) else 3
+         for item in column),
+        dtype=np.int8, count=count,
+    )
+    valid[kinds == 3] = False
+
+    numeric = np.flatnonzero(kinds == 2)
+    if numeric.size:
+        seconds = np.array([_as_float(column[index]) for index in numeric], dtype=np.float64)
+        finite = np.isfinite(seconds) & (np.abs(seconds) < 1e11)
+        parsed[numeric[finite]] = (seconds[finite] * 1e6).astype(np.int64).astype("datetime64[us]")
+        valid[numeric[~finite]] = False
+
+    strings = np.flatnonzero(kinds == 1)
+    if strings.size:
+        values = [column[index] for index in strings]
+        with warnings.catch_warnings():
+            # numpy converts explicit UTC offsets but warns that doing so is deprecated.
+            warnings.simplefilter("ignore")
+            try:
+                parsed[strings] = np.array(values, dtype="datetime64[us]")
+            except (ValueError, OverflowError):
+                # At least one string is malformed or out of range: find out which, one by one.
+                for index, value in zip(strings, values):
+                    try:
+                        parsed[index] = np.datetime64(value, "us")
+                    except (ValueError, OverflowError):
+                        valid[index] = False
+    # datetime64 reaches far beyond what datetime (and the database) can hold.
+    valid &= ~np.isnat(parsed) & (parsed >= np.datetime64("0001-01-01")) & (parsed < np.datetime64("10000-01-01"))
+    return parsed, valid
+
+
+def validate_readings(count, columns, now=None):
+    """
+    Validate parsed columns.
+
+    :return: Tuple of (rows, rejected) where rows are (machine_name, topic, value, unit,
+             timestamp) tuples ready for MachineData.bulk_create and rejected is a list of
+             {"index", "reason"} dicts in index order.
+    """
+    now = now or datetime.utcnow()
+    reasons = np.full(count, None, dtype=object)
+    accepted = np.ones(count, dtype=bool)
+
+    values = columns["value"]
+    numeric = np.fromiter(
+        (isinstance(item, (int, float)) and not isinstance(item, bool) for item in values), dtype=bool, count=count
+    )
+    value_array = np.array([_as_float(item) if ok else np.nan for item, ok in zip(values, numeric)], dtype=np.float64)
+    timestamps, timestamps_valid = _parse_timestamps(columns["timestamp"], now)
+    units = columns["unit"]
+    unit_valid = np.fromiter((item is None or isinstance(item, str) for item in units), dtype=bool, count=count)
+
+    # Later checks take precedence, so the most basic problem is the one reported.
+    for valid, reason in (
+        (unit_valid, "unit must be a string"),
+        (timestamps_valid, "timestamp must be ISO 8601 or epoch seconds"),
+        (np.isfinite(value_array), "value must be a finite number"),
+        (_string_mask(columns["topic"]), "topic must be a non-empty string"),
+        (_string_mask(columns["machine_name"]), "machine_name must be a non-empty string"),
+    ):
+        reasons[~valid] = reason
+        accepted &= valid
+
+    rejected = [{"index": int(index), "reason": reasons[index]} for index in np.flatnonzero(~accepted)]
+    accepted = np.flatnonzero(accepted)
+    rows = list(zip(
+        [columns["machine_name"][index] for index in accepted],
+        [columns["topic"][index] for index in accepted],
+        value_array[accepted].tolist(),
+        [units[index] or "" for index in accepted],
+        timestamps[accepted].tolist(),
+    ))
+    return rows, rejected
@@ -1,11 +1,25 @@
 """
 File contains data logic.
+
+The simulated machine of this process (its name and randomly picked
+parameters) is chosen on first use rather than on import, so importing the
+application stays free of side effects. MACHINE_NAME, MACHINE_PARAMETERS and
+TOPICS remain importable and resolve to the same profile.
 """
 
 import random
+import threading
+from collections import namedtuple
+
 from app.config.machine_parameters import MACHINE_NAMES
 from app.services.parameter_randomizer import get_random_parameters
 
+# `topics` maps each parameter to its unit.
+MachineProfile = namedtuple("MachineProfile", ["name", "parameters", "topics"])
+
+_profile = None
+_profile_lock = threading.Lock()
+
 def get_machine_name():
     """
     Return a randomly selected machine name from the list.
@@ -13,7 +27,22 @@ def get_machine_name():
     machine_name = random.choice(MACHINE_NAMES)
     return machine_name
 
-MACHINE_PARAMETERS = get_random_parameters()
-MACHINE_NAME = get_machine_name()
+def get_machine_profile():
+    """Return the simulated machine of this process, choosing it on first call."""
+    global _profile  # pylint: disable=global-statement
+    if _profile is None:
+        with _profile_lock:
+            if _profile is None:
+                parameters = get_random_parameters()
+                _profile = MachineProfile(
+                    get_machine_name(), parameters,
+                    {param: details["unit"] for param, details in parameters.items()},
+                )
+    return _profile
+
+_PROFILE_ATTRIBUTES = {"MACHINE_NAME": "name", "MACHINE_PARAMETERS": "parameters", "TOPICS": "topics"}
 
-TOPICS = {param: details["unit"] for param, details in MACHINE_PARAMETERS.items()}
+def __getattr__(name):
+    if name in _PROFILE_ATTRIBUTES:
+        return getattr(get_machine_profile(), _PROFILE_ATTRIBUTES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,148 @@
+"""
+File contains bulk export logic for machine data.
+
+Exports stream raw rows from a server-side cursor and encode them chunk by
+chunk, without building ORM objects or per-row dicts, so memory use stays
+flat however much history is exported.
+
+Formats:
+    ndjson  one JSON object per line, same fields as GET /api/machine-data
+    csv     header line plus one row per reading
+    arrow   Arrow IPC stream, one record batch per chunk (requires pyarrow)
+"""
+
+import csv
+import io
+import json
+import math
+
+import numpy as np
+
+from app.config.database import Database
+from app.models.models import MachineData
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+FIELDS = ("id", "machine_name", "topic", "value", "unit", "timestamp")
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+EXTENSIONS = {"ndjson": "ndjson", "csv": "csv", "arrow": "arrows"}
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def available_formats():
+    """Return the export formats usable in this environment."""
+    return [name for name in MEDIA_TYPES if name != "arrow" or pa is not None]
+
+
+def _json_float(value):
+    return repr(value) if math.isfinite(value) else json.dumps(value)
+
+
+def _ndjson_chunks(machine_name, series, chunks):
+    # Everything but id, value and timestamp is constant per series, so it is encoded once.
+    prefixes = {
+        series_id: (
+            f',"machine_name":{json.dumps(machine_name)},"topic":{json.dumps(topic)}',
+            f',"unit":{json.dumps(unit)}',
+        )
+        for series_id, (topic, unit) in series.items()
+    }
+    for rows in chunks:
+        lines = []
+        for entry_id, timestamp, value, series_id in rows:
+            names, unit = prefixes[series_id]
+            lines.append(f'{{"id":{entry_id}{names},"value":{_json_float(value)}{unit},'
+                         f'"timestamp":"{timestamp.isoformat()}"}}\n')
+        yield "".join(lines).encode()
+
+
+def _csv_chunks(machine_name, series, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(FIELDS)
+    for rows in chunks:
+        writer.writerows(
+            (entry_id, machine_name, series[series_id][0], value, series[series_id][1], timestamp.isoformat())
+            for entry_id, timestamp, value, series_id in rows
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _arrow_chunks(machine_name, series, chunks):
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("machine_name", pa.dictionary(pa.int32(), pa.string())),
+        ("topic", pa.dictionary(pa.int32(), pa.string())),
+        ("value", pa.float64()),
+        ("unit", pa.dictionary(pa.int32(), pa.string())),
+        ("timestamp", pa.timestamp("us")),
+    ])
+    # The string columns are dictionary-encoded against the same dictionaries in
+    # every batch, so the stream carries each name once.
+    positions = {series_id: index for index, series_id in enumerate(series)}
+    machines = pa.array([machine_name], pa.string())
+    topics = pa.array([topic for topic, _ in series.values()], pa.string())
+    units = pa.array([unit for _, unit in series.values()], pa.string())
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for rows in chunks:
+            ids, timestamps, values, series_ids = zip(*rows)
+            indexes = pa.array([positions[series_id] for series_id in series_ids], pa.int32())
+            writer.write_batch(pa.record_batch([
+                pa.array(ids, pa.int64()),
+                pa.DictionaryArray.from_arrays(pa.array(np.zeros(len(rows), dtype=np.int32)), machines),
+                pa.DictionaryArray.from_arrays(indexes, topics),
+                pa.array(values, pa.float64()),
+                pa.DictionaryArray.from_arrays(indexes, units),
+                pa.array(timestamps, pa.timestamp("us")),
+            ], schema=schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    # Closing the writer appends the end-of-stream marker.
+    yield sink.getvalue()
+
+
+_ENCODERS = {"ndjson": _ndjson_chunks, "csv": _csv_chunks, "arrow": _arrow_chunks}
+
+
+def encode_chunks(export_format, machine_name, series, chunks):
+    """
+    Encode chunks of raw (id, timestamp, value, series_id) rows, yielding bytes per chunk.
+
+    :param series: {series_id: (topic, unit)} covering every row.
+    """
+    if export_format not in available_formats():
+        raise ValueError(f"Unsupported export format '{export_format}'.")
+    return _ENCODERS[export_format](machine_name, series, chunks)
+
+
+def stream_export(machine_name, series, export_format="ndjson", start=None, end=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the encoded export of a machine's readings in chunks of bytes.
+
+    Runs on its own API session, opened on the first chunk and closed when the
+    stream ends or the client goes away, so it can outlive the request scope.
+
+    :param series: {series_id: (topic, unit)} of the series to export, see Series.for_machine.
+    :param start: Inclusive lower timestamp bound.
+    :param end: Exclusive upper timestamp bound.
+    """
+    session = Database.get_api_session()
+    try:
+        chunks = MachineData.iter_entry_rows(session, sorted(series), start, end, chunk_size)
+        yield from encode_chunks(export_format, machine_name, series, chunks)
+    finally:
+        session.close()
@@ -0,0 +1,272 @@
+"""
+File contains fleet simulation logic.
+
+Drives many virtual machines from a single asyncio loop: every machine is a
+series of a SampleScheduler rather than a thread, so thousands of machines
+cost one core and a few MB instead of thousands of threads.
+
+Usage:
+    python -m app.services.fleet --machines 10000 --min-rate 1 --max-rate 1
+    python -m app.services.fleet --machines 10000 --dry-run --duration 30
+    python -m app.services.fleet --machines 10 --min-rate 1000 --max-rate 1000 --jitter 0.2
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+
+import numpy as np
+
+from app.config.machine_parameters import GLOBAL_PARAMETERS
+from app.config.mqtt import BATCH_TOPIC_FORMAT, TOPIC_FORMAT
+from app.services.parameter_randomizer import RandomWalkGenerator
+from app.services.payload import encode_samples
+from app.services.scheduler import SampleScheduler
+
+logger = logging.getLogger(__name__)
+
+# Timesteps generated per machine at once; refills are amortized over this many ticks.
+BLOCK_SIZE = 256
+# Ticks handled between yields to the event loop.
+TICKS_PER_YIELD = 1000
+
+
+class VirtualMachine:
+    """State of one simulated machine."""
+
+    __slots__ = ("name", "parameters", "topics", "batch_topic", "ranges", "period", "block", "cursor",
+                 "pending", "sequence")
+
+    def __init__(self, name, parameters, rate):
+        self.name = name
+        self.parameters = list(parameters)
+        self.topics = [TOPIC_FORMAT.format(machine=name, parameter=param) for param in self.parameters]
+        self.batch_topic = BATCH_TOPIC_FORMAT.format(machine=name)
+        self.ranges = [GLOBAL_PARAMETERS[param]["range"] for param in self.parameters]
+        self.period = 1.0 / rate
+        # Pre-generated readings, one list of parameter values per timestep.
+        self.block = []
+        self.cursor = 0
+        # Binary payloads only: (timestamp µs, values) ticks not yet published, and the next batch sequence.
+        self.pending = []
+        self.sequence = 0
+
+
+def build_fleet(count, prefix="Machine", min_rate=1.0, max_rate=1.0, max_params=4, seed=None):
+    """
+    Create `count` virtual machines with parameter sets drawn from GLOBAL_PARAMETERS.
+
+    :param min_rate: Lowest per-machine publish rate in samples per second.
+    :param max_rate: Highest per-machine publish rate; rates are drawn uniformly in between.
+    :param max_params: Number of parameters per machine (capped by GLOBAL_PARAMETERS).
+    """
+    rng = random.Random(seed)
+    names = list(GLOBAL_PARAMETERS)
+    width = len(str(count - 1))
+    return [
+        VirtualMachine(
+            f"{prefix}-{index:0{width}d}",
+            rng.sample(names, min(max_params, len(names))),
+            rng.uniform(min_rate, max_rate),
+        )
+        for index in range(count)
+    ]
+
+
+class FleetSimulator:
+    """Publishes readings for a fleet of virtual machines on their own schedules."""
+
+    def __init__(self, machines, publish, data_margin=0.03, report_interval=10.0, seed=None,
+                 payload="text", samples_per_message=1, jitter=0.0, max_backlog=1.0):
+        """
+        :param publish: Callable (topic, payload) -> bool, returning False on failure.
+        :param data_margin: Maximum relative step of each parameter's random walk.
+        :param jitter: Delay each tick by up to this fraction of the machine's period.
+        :param max_backlog: Seconds a machine may fall behind before its missed ticks are skipped.
+        :param payload: "text" publishes one float per parameter and message; "binary" publishes
+                        every parameter of `samples_per_message` ticks as one batch.
+        """
+        self.machines = machines
+        self.publish = publish
+        self.binary = payload == "binary"
+        self.samples_per_message = samples_per_message
+        self.report_interval = report_interval
+        self.target_rate = sum(len(m.parameters) / m.period for m in machines)
+        self._scheduler = SampleScheduler(jitter=jitter, max_backlog=max_backlog, seed=seed)
+        self._generator = RandomWalkGenerator([m.ranges for m in machines], data_margin=data_margin, seed=seed)
+        self._stats = {"published": 0, "failed": 0, "messages": 0}
+        # Converts scheduler (event loop time) deadlines to producer timestamps; set by run().
+        self._epoch = time.time()
+
+    def stats(self):
+        """Return a snapshot of publish counters and scheduling lag."""
+        scheduler = self._scheduler.stats()
+        snapshot = dict(self._stats)
+        snapshot["machines"] = len(self.machines)
+        snapshot["target_rate"] = self.target_rate
+        snapshot.update(ticks=scheduler["ticks"], skipped=scheduler["skipped"],
+                        mean_lag=scheduler["mean_lag"], max_lag=scheduler["max_lag"])
+        return snapshot
+
+    def _prefill(self):
+        """Generate the first block of every machine in one vectorized call."""
+        blocks = self._generator.next_batch(BLOCK_SIZE)
+        for machine, block in zip(self.machines, blocks):
+            machine.block = block.T.tolist()
+            machine.cursor = 0
+
+    def _tick(self, index, deadline):
+        """Publish the next pre-generated reading of every parameter of one machine, due at `deadline`."""
+        machine = self.machines[index]
+        if machine.cursor >= len(machine.block):
+            machine.block = self._generator.next_batch(BLOCK_SIZE, rows=[index])[0].T.tolist()
+            machine.cursor = 0
+        values = machine.block[machine.cursor]
+        machine.cursor += 1
+
+        if self.binary:
+            machine.pending.append((int((self._epoch + deadline) * 1e6), values))
+            if len(machine.pending) >= self.samples_per_message:
+                self._publish_pending(machine)
+            return
+
+        self._stats["messages"] += len(values)
+        published = failed = 0
+        for topic, value in zip(machine.topics, values):
+            if self.publish(topic, value):
+                published += 1
+            else:
+                failed += 1
+        self._stats["published"] += published
+        self._stats["failed"] += failed
+
+    def _publish_pending(self, machine):
+        """Publish the pending ticks of one machine as a single binary batch."""
+        ticks, params = len(machine.pending), len(machine.parameters)
+        timestamps = np.repeat([timestamp for timestamp, _ in machine.pending], params)
+        values = [value for _, tick_values in machine.pending for value in tick_values]
+        payload = encode_samples(machine.parameters, timestamps, np.tile(np.arange(params), ticks), values,
+                                 machine.sequence)
+        machine.pending = []
+        machine.sequence += 1
+        self._stats["messages"] += 1
+        if self.publish(machine.batch_topic, payload):
+            self._stats["published"] += len(values)
+        else:
+            self._stats["failed"] += len(values)
+
+    async def run(self, duration=None):
+        """Run until cancelled or for `duration` seconds."""
+        self._prefill()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self._epoch = time.time() - started
+        stop_at = started + duration if duration else None
+        scheduler = self._scheduler
+        # Machines start at random phases of their period instead of firing together.
+        for index, machine in enumerate(self.machines):
+            scheduler.add(index, 1.0 / machine.period, started)
+
+        next_report = started + self.report_interval
+        last_report = (started, 0)
+        stats = self._stats
+        logger.info(f"Fleet of {len(self.machines)} machines started, target {self.target_rate:.0f} msg/s.")
+
+        while len(scheduler) and (stop_at is None or loop.time() < stop_at):
+            now = loop.time()
+            due = scheduler.pop_due(now, limit=TICKS_PER_YIELD)
+            for index, deadline, _ in due:
+                self._tick(index, deadline)
+
+            if now >= next_report:
+                elapsed = now - last_report[0]
+                achieved = (stats["published"] - last_report[1]) / elapsed if elapsed else 0.0
+                lag = scheduler.stats()
+                logger.info(f"Fleet publish rate {achieved:.0f}/{self.target_rate:.0f} msg/s, "
+                            f"failed {stats['failed']}, max lag {lag['max_lag'] * 1000:.1f} ms, "
+                            f"skipped {lag['skipped']} ticks.")
+                last_report = (now, stats["published"])
+                next_report = now + self.report_interval
+
+            if len(due) == TICKS_PER_YIELD:
+                await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(max(0.0, scheduler.next_due() - loop.time()))
+
+        for machine in self.machines:
+            if machine.pending:
+                self._publish_pending(machine)
+
+        elapsed = loop.time() - started
+        return {**self.stats(), "elapsed": elapsed,
+                "achieved_rate": stats["published"] / elapsed if elapsed else 0.0}
+
+
+def mqtt_publisher():
+    """Return (publish, client) for a single MQTT connection shared by the whole fleet."""
+    # Imported lazily so dry runs need neither a broker nor its configuration.
+    from paho.mqtt.client import MQTT_ERR_SUCCESS  # pylint: disable=import-outside-toplevel
+    from app.core.broker import setup_mqtt_client  # pylint: disable=import-outside-toplevel
+
+    client = setup_mqtt_client(f"fleet-{os.getpid()}", None, [])
+    client.loop_start()
+
+    def publish(topic, payload):
+        return client.publish(topic, payload).rc == MQTT_ERR_SUCCESS
+
+    return publish, client
+
+
+def main():
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Simulate a fleet of machines publishing over MQTT.")
+    parser.add_argument("--machines", type=int, default=1000)
+    parser.add_argument("--prefix", default="Machine")
+    parser.add_argument("--min-rate", type=float, default=1.0, help="Lowest per-machine samples per second.")
+    parser.add_argument("--max-rate", type=float, default=1.0, help="Highest per-machine samples per second.")
+    parser.add_argument("--params", type=int, default=4, help="Parameters per machine.")
+    parser.add_argument("--duration", type=float, default=None, help="Seconds to run; forever if omitted.")
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="Generate readings without publishing them.")
+    parser.add_argument("--payload", choices=["text", "binary"], default="text")
+    parser.add_argument("--samples-per-message", type=int, default=1,
+                        help="Ticks of all parameters packed into one binary payload.")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Delay each tick by up to this fraction of its period.")
+    parser.add_argument("--max-backlog", type=float, default=1.0,
+                        help="Seconds a machine may fall behind before missed ticks are skipped.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    build_started = time.perf_counter()
+    machines = build_fleet(args.machines, args.prefix, args.min_rate, args.max_rate, args.params, args.seed)
+    logger.info(f"Built {len(machines)} machines in {time.perf_counter() - build_started:.2f}s.")
+
+    client = None
+    if args.dry_run:
+        def publish(topic, payload):  # pylint: disable=unused-argument
+            return True
+    else:
+        publish, client = mqtt_publisher()
+
+    simulator = FleetSimulator(machines, publish, report_interval=args.report_interval, seed=args.seed,
+                               payload=args.payload, samples_per_message=args.samples_per_message,
+                               jitter=args.jitter, max_backlog=args.max_backlog)
+    try:
+        result = asyncio.run(simulator.run(args.duration))
+        logger.info(f"Fleet finished: {result}")
+    except KeyboardInterrupt:
+        logger.info("Fleet simulation interrupted by user.")
+    finally:
+        if client is not None:
+            client.loop_stop()
+            client.disconnect()
+
+
+if __name__ == "__main__":
+    main()
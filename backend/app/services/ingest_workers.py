@@ -0,0 +1,163 @@
+"""
+File contains ingestion worker logic.
+
+Runs K worker processes that consume readings through an MQTT v5 shared
+subscription (`$share/<group>/machines/+/+`): the broker hands every message
+to exactly one worker, and each worker decodes, routes and batch-writes its
+share with its own ingestion writer and database pool, so ingest throughput
+scales with cores instead of being capped by one paho network thread.
+
+Usage:
+    python -m app.services.ingest_workers --workers 4
+    python -m app.services.ingest_workers --workers 4 --group ingest --report-interval 5
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+from app.config.database import Database
+from app.config.ingestion import INGEST_REPORT_INTERVAL, INGEST_SHARE_GROUP, INGEST_WORKERS, SPILL_DIR
+from app.config.mqtt import MQTT_SUBSCRIPTIONS
+from app.models.migrations import PARTITIONED, create_schema, start_partition_maintenance
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = "%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def run_worker(index, group, database_url, report_interval, stop_event, reports):
+    """
+    Entry point of one worker process: consume the shared subscription until
+    `stop_event` is set, putting a throughput report on `reports` every interval.
+    """
+    # The parent handles Ctrl+C and stops workers through stop_event.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+
+    # pylint: disable=import-outside-toplevel
+    from app.core.broker import shared_subscription, start_mqtt_client
+    from app.services.ingestion import configure_ingestion_writer, start_ingestion_writer, stop_ingestion_writer
+    from app.services.mqtt_manager import MESSAGES_RECEIVED, configure_message_handling, handle_mqtt_message
+
+    # No connection yet: while the database is unreachable the writer spills readings.
+    Database.configure(database_url)
+    configure_message_handling(store=True, live=False, check_sequence=False)
+    # A spill buffer has a single writer, so every worker gets its own directory.
+    configure_ingestion_writer(spill_dir=os.path.join(SPILL_DIR, f"worker-{index}") if SPILL_DIR else None)
+    writer = start_ingestion_writer()
+    topics = [shared_subscription(topic_filter, group) for topic_filter in MQTT_SUBSCRIPTIONS]
+
+    def report_status(connected, detail):
+        if connected:
+            logger.info(f"Ingestion worker {index} subscribed to {', '.join(topics)}.")
+        else:
+            logger.warning(f"Ingestion worker {index} has no MQTT broker ({detail}); retrying in the background.")
+
+    # Connects in the background and resubscribes on every reconnect, so neither a broker
+    # that is down at start nor a dropped session stops the worker.
+    client = start_mqtt_client(f"ingest-{group}-{index}-{os.getpid()}", handle_mqtt_message, topics,
+                               on_status=report_status)
+    try:
+
+        received = MESSAGES_RECEIVED.labels()
+        last_time, last_received, last_written = time.monotonic(), 0.0, 0
+        while not stop_event.wait(report_interval):
+            now, stats = time.monotonic(), writer.stats()
+            elapsed = now - last_time
+            report = {
+                "worker": index,
+                "messages_per_s": (received.value - last_received) / elapsed,
+                "rows_per_s": (stats["rows_written"] - last_written) / elapsed,
+                "queue_depth": stats["queue_depth"],
+                "dropped": stats["dropped"],
+                "rows_failed": stats["rows_failed"],
+            }
+            last_time, last_received, last_written = now, received.value, stats["rows_written"]
+            logger.info(f"Worker {index}: {report['messages_per_s']:.0f} msg/s received, "
+                        f"{report['rows_per_s']:.0f} rows/s written, queue {report['queue_depth']}.")
+            reports.put(report)
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        stop_ingestion_writer()
+        Database.dispose()
+        logger.info(f"Ingestion worker {index} stopped.")
+
+
+def run_workers(count, group=INGEST_SHARE_GROUP, database_url=None, report_interval=INGEST_REPORT_INTERVAL):
+    """Start `count` worker processes and log their combined throughput until interrupted."""
+    # Create the schema once up front instead of racing K workers to it.
+    Database.initialize(database_url)
+    create_schema(Database.get_engine())
+    if PARTITIONED:
+        start_partition_maintenance(Database.get_engine())
+    Database.dispose()
+
+    # Spawned rather than forked: workers must not inherit the parent's threads or connections.
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    reports = context.Queue()
+    workers = [
+        context.Process(target=run_worker, name=f"ingest-worker-{index}",
+                        args=(index, group, database_url, report_interval, stop_event, reports))
+        for index in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    logger.info(f"Started {count} ingestion workers in shared subscription group '{group}'.")
+
+    def request_stop(signum, frame):  # pylint: disable=unused-argument
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    latest = {}
+    next_report = time.monotonic() + report_interval
+    try:
+        while not stop_event.is_set() and any(worker.is_alive() for worker in workers):
+            try:
+                report = reports.get(timeout=1.0)
+                latest[report["worker"]] = report
+            except queue.Empty:
+                pass
+            if latest and time.monotonic() >= next_report:
+                next_report += report_interval
+                logger.info(f"{len(latest)} workers: {sum(r['messages_per_s'] for r in latest.values()):.0f} msg/s "
+                            f"received, {sum(r['rows_per_s'] for r in latest.values()):.0f} rows/s written.")
+    except KeyboardInterrupt:
+        logger.info("Ingestion workers interrupted by user.")
+    finally:
+        stop_event.set()
+        for worker in workers:
+            worker.join(30)
+            if worker.is_alive():
+                logger.error(f"{worker.name} did not stop in time; terminating it.")
+                worker.terminate()
+    return latest
+
+
+def main():
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Run shared-subscription MQTT ingestion workers.")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS or os.cpu_count() or 1)
+    parser.add_argument("--group", default=INGEST_SHARE_GROUP, help="Shared subscription group name.")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--report-interval", type=float, default=INGEST_REPORT_INTERVAL)
+    args = parser.parse_args()
+    if args.workers < 0:
+        parser.error("--workers must not be negative.")
+
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    if args.workers == 0:
+        # Not an error: the backend stores readings itself, and a failing exit would be restarted.
+        logger.info("No ingestion workers requested (INGEST_WORKERS=0); the backend stores readings itself.")
+        return
+    run_workers(args.workers, args.group, args.database_url, args.report_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+File contains batched ingestion logic.
+
+MQTT callbacks only enqueue readings; a dedicated writer thread drains the
+queue and flushes readings to the database in batches, either when a batch is
+full or when its oldest reading has waited long enough.
+
+While the database is unreachable, or the queue backs up past its high
+watermark, batches are spilled to a local write-ahead buffer instead
+(app/services/spill.py), so ingest keeps accepting readings at full speed. A
+replay thread feeds spilled readings back at a throttled rate once the
+database answers again. Only connection-level errors count as an outage: a
+batch the database rejects is split until the offending readings are found,
+and those are discarded instead of being spilled or retried.
+"""
+
+import queue
+import threading
+import time
+import logging
+from sqlalchemy.exc import InterfaceError, OperationalError, SQLAlchemyError, TimeoutError as PoolTimeoutError
+
+from app.config.database import Database
+from app.config.ingestion import (
+    INGEST_BATCH_SIZE, INGEST_FLUSH_INTERVAL, INGEST_QUEUE_SIZE, SPILL_DIR, SPILL_FSYNC, SPILL_HIGH_WATERMARK,
+    SPILL_MAX_BYTES, SPILL_REPLAY_ROWS_PER_SECOND, SPILL_RETRY_INTERVAL, SPILL_SEGMENT_BYTES,
+)
+from app.models.models import MachineData
+from app.services.metrics import Callback, Counter, Histogram
+from app.services.spill import SpillBuffer
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+ROWS = Counter("orchestralink_ingest_rows_total", "Readings flushed by the ingestion writer, by result.", ("result",))
+_ROWS_WRITTEN = ROWS.labels("written")
+_ROWS_FAILED = ROWS.labels("failed")
+_ROWS_DROPPED = ROWS.labels("dropped")
+_ROWS_SPILLED = ROWS.labels("spilled")
+_ROWS_REPLAYED = ROWS.labels("replayed")
+FLUSH_SECONDS = Histogram("orchestralink_ingest_flush_seconds", "Time to write one batch of readings.")
+BATCH_SIZE = Histogram("orchestralink_ingest_batch_size", "Readings per flushed batch.",
+                       buckets=(1, 10, 100, 500, 1000, 2500, 5000, 10000, 50000))
+
+
+def is_connection_error(error):
+    """Whether a database error means the database is unreachable, rather than that the rows are bad."""
+    return (isinstance(error, (OperationalError, InterfaceError, PoolTimeoutError))
+            or getattr(error, "connection_invalidated", False))
+
+
+class IngestionWriter:
+    """Background writer flushing queued readings to the database in batches."""
+
+    def __init__(self, batch_size=INGEST_BATCH_SIZE, flush_interval=INGEST_FLUSH_INTERVAL,
+                 max_queue_size=INGEST_QUEUE_SIZE, on_flush=None, spill_dir=SPILL_DIR,
+                 high_watermark=SPILL_HIGH_WATERMARK, retry_interval=SPILL_RETRY_INTERVAL,
+                 replay_rate=SPILL_REPLAY_ROWS_PER_SECOND):
+        """
+        :param on_flush: Optional callable (batch, failed) invoked on the writer thread after each flush.
+        :param spill_dir: Directory of the spill buffer, opened on start; None or "" disables spilling.
+        :param high_watermark: Fraction of the queue above which batches are spilled instead of written.
+        :param retry_interval: Seconds between database attempts after a database error.
+        :param replay_rate: Spilled readings replayed into the database per second.
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.spill_dir = spill_dir
+        self.retry_interval = retry_interval
+        self.replay_rate = replay_rate
+        self._high_watermark = max(1, int(max_queue_size * high_watermark)) if max_queue_size > 0 else None
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._spill = None
+        self._replay_thread = None
+        self._replay_stop = threading.Event()
+        # monotonic time before which the database is considered down; None while it is healthy.
+        self._retry_at = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "dropped": 0,
+            "rows_written": 0,
+            "rows_failed": 0,
+            "rows_spilled": 0,
+            "rows_replayed": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+            "total_flush_seconds": 0.0,
+        }
+
+    @property
+    def running(self):
+        """Whether the writer thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the writer thread."""
+        if self.running:
+            logger.warning("Ingestion writer is already running.")
+            return
+        if self.spill_dir and self._spill is None:
+            try:
+                self._spill = SpillBuffer(self.spill_dir, SPILL_SEGMENT_BYTES, SPILL_MAX_BYTES, SPILL_FSYNC)
+            except OSError as e:
+                logger.error(f"Could not open spill buffer in '{self.spill_dir}', spilling disabled: {e}")
+        self._thread = threading.Thread(target=self._run, name="ingestion-writer", daemon=True)
+        self._thread.start()
+        if self._spill is not None:
+            self._replay_stop.clear()
+            self._replay_thread = threading.Thread(target=self._replay, name="ingestion-replay", daemon=True)
+            self._replay_thread.start()
+        logger.info(f"Ingestion writer started (batch_size={self.batch_size}, "
+                    f"flush_interval={self.flush_interval}s, spill_dir={self.spill_dir or None}).")
+
+    def stop(self, timeout=None):
+        """
+        Stop the writer thread after flushing everything already enqueued.
+        Spilled readings that were not replayed yet stay on disk for the next start.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("Ingestion writer did not stop within the timeout.")
+        else:
+            logger.info("Ingestion writer stopped.")
+        self._thread = None
+        if self._replay_thread is not None:
+            self._replay_stop.set()
+            self._replay_thread.join(timeout)
+            self._replay_thread = None
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def submit(self, machine_name, topic, value, unit, timestamp):
+        """Enqueue a reading without blocking. Returns False if the queue is full."""
+        try:
+            self._queue.put_nowait((machine_name, topic, value, unit, timestamp))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["dropped"] += 1
+            _ROWS_DROPPED.inc()
+            return False
+        with self._stats_lock:
+            self._stats["enqueued"] += 1
+        return True
+
+    def stats(self):
+        """Return a snapshot of the writer's queue and flush statistics."""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        batches = snapshot["batches"]
+        snapshot["queue_depth"] = self._queue.qsize()
+        flushed = snapshot["rows_written"] + snapshot["rows_failed"]
+        snapshot["avg_batch_size"] = flushed / batches if batches else 0.0
+        snapshot["avg_flush_seconds"] = snapshot["total_flush_seconds"] / batches if batches else 0.0
+        snapshot["database_available"] = self._retry_at is None
+        spill = self._spill
+        if spill is not None:
+            snapshot.update({f"spill_{key}": value for key, value in spill.stats().items()})
+        return snapshot
+
+    def _database_down(self):
+        """Whether the database failed recently enough that it should not be tried yet."""
+        retry_at = self._retry_at
+        return retry_at is not None and time.monotonic() < retry_at
+
+    def _mark_database_down(self):
+        if self._retry_at is None:
+            logger.warning(f"Database unavailable, spilling readings to '{self.spill_dir}' "
+                           f"and retrying every {self.retry_interval}s.")
+        self._retry_at = time.monotonic() + self.retry_interval
+
+    def _mark_database_up(self):
+        if self._retry_at is not None:
+            logger.info("Database available again.")
+            self._retry_at = None
+
+    def _run(self):
+        """Drain the queue, flushing on size, age or shutdown."""
+        batch = []
+        deadline = None
+        stopping = False
+
+        while not stopping:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                # Drain whatever is already waiting without blocking again.
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+
+    def _write(self, rows):
+        """Write rows to the database in one transaction. Raises SQLAlchemyError on failure."""
+        session = Database.get_session()
+        try:
+            MachineData.bulk_create(session, rows)
+        except SQLAlchemyError:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _write_checked(self, rows):
+        """
+        Write rows, splitting the batch in halves to isolate readings the database
+        rejects (constraint or data errors), which are logged and left out.
+
+        :return: Tuple of (rejected, unwritten, error): when a connection error stops
+                 the write, `unwritten` holds the rows not written yet and `error` the
+                 exception; otherwise they are [] and None.
+        """
+        rejected = []
+        pending = [rows]
+        while pending:
+            chunk = pending.pop()
+            try:
+                self._write(chunk)
+            except SQLAlchemyError as db_error:
+                if is_connection_error(db_error):
+                    return rejected, list(chunk) + [row for part in reversed(pending) for row in part], db_error
+                if len(chunk) == 1:
+                    reason = getattr(db_error, "orig", db_error)
+                    logger.error(f"Discarding reading rejected by the database: {chunk[0]!r} ({reason})")
+                    rejected.append(chunk[0])
+                    continue
+                middle = len(chunk) // 2
+                pending.append(chunk[middle:])
+                pending.append(chunk[:middle])
+        return rejected, [], None
+
+    def _flush(self, batch):
+        """Write one batch to the database, or spill it, and record its statistics."""
+        started = time.perf_counter()
+        failed = spilled = 0
+        backed_up = self._high_watermark is not None and self._queue.qsize() >= self._high_watermark
+        if self._spill is not None and (backed_up or self._database_down()):
+            spilled = self._spill_batch(batch)
+            failed = len(batch) - spilled
+        else:
+            try:
+                rejected, unwritten, db_error = self._write_checked(batch)
+                failed = len(rejected)
+                if db_error is None:
+                    self._mark_database_up()
+                else:
+                    logger.error(f"Database error while flushing {len(unwritten)} readings: {db_error}")
+                    if self._spill is not None:
+                        self._mark_database_down()
+                        spilled = self._spill_batch(unwritten)
+                    failed += len(unwritten) - spilled
+            except Exception as e:
+                logger.error(f"Unexpected error while flushing {len(batch)} readings: {e}")
+                failed = len(batch)
+        written = len(batch) - failed - spilled
+        elapsed = time.perf_counter() - started
+
+        with self._stats_lock:
+            stats = self._stats
+            stats["batches"] += 1
+            stats["rows_written"] += written
+            stats["rows_failed"] += failed
+            stats["rows_spilled"] += spilled
+            stats["last_batch_size"] = len(batch)
+            stats["max_batch_size"] = max(stats["max_batch_size"], len(batch))
+            stats["last_flush_seconds"] = elapsed
+            stats["max_flush_seconds"] = max(stats["max_flush_seconds"], elapsed)
+            stats["total_flush_seconds"] += elapsed
+        _ROWS_WRITTEN.inc(written)
+        _ROWS_FAILED.inc(failed)
+        _ROWS_SPILLED.inc(spilled)
+        FLUSH_SECONDS.observe(elapsed)
+        BATCH_SIZE.observe(len(batch))
+
+        logger.debug("Flushed %d readings in %.1f ms.", len(batch), elapsed * 1000)
+        if self.on_flush is not None:
+            self.on_flush(batch, failed)
+
+    def _spill_batch(self, batch):
+        """Append a batch to the spill buffer. Returns the number of readings spilled."""
+        try:
+            self._spill.append(batch)
+        except OSError as e:
+            logger.error(f"Could not spill {len(batch)} readings: {e}")
+            return 0
+        return len(batch)
+
+    def _replay(self):
+        """
+        Feed spilled readings back into the database, oldest segment first, at
+        no more than `replay_rate` readings per second and only while the
+        database is up. Progress is checkpointed after every record; readings
+        the database rejects are counted as failed and skipped, not retried.
+        """
+        spill = self._spill
+        while not self._replay_stop.wait(0 if self._replay_ready(spill) else self.retry_interval):
+            segment = spill.next_segment()
+            if segment is None:
+                continue
+            finished = True
+            for offset, rows in spill.records(segment):
+                if self._replay_stop.is_set() or self._database_down():
+                    finished = False
+                    break
+                started = time.monotonic()
+                rejected, unwritten, db_error = self._write_checked(rows)
+                if db_error is not None:
+                    logger.error(f"Database error while replaying {len(unwritten)} spilled readings: {db_error}")
+                    self._mark_database_down()
+                    finished = False
+                    break
+                self._mark_database_up()
+                spill.commit(segment, offset)
+                replayed = len(rows) - len(rejected)
+                with self._stats_lock:
+                    self._stats["rows_replayed"] += replayed
+                    self._stats["rows_failed"] += len(rejected)
+                _ROWS_REPLAYED.inc(replayed)
+                _ROWS_FAILED.inc(len(rejected))
+                if self.replay_rate > 0:
+                    self._replay_stop.wait(max(0.0, len(rows) / self.replay_rate - (time.monotonic() - started)))
+            if finished:
+                spill.remove(segment)
+                logger.info(f"Replayed spill segment {segment.name}.")
+
+    def _replay_ready(self, spill):
+        """Whether there is spilled data and the database is worth trying."""
+        return spill.has_pending() and not self._database_down()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_ingestion_writer():
+    """Return the process-wide ingestion writer, creating it on first use."""
+    global _writer  # pylint: disable=global-statement
+    with _writer_lock:
+        if _writer is None:
+            _writer = IngestionWriter()
+        return _writer
+
+
+def configure_ingestion_writer(**kwargs):
+    """Replace the process-wide ingestion writer with one built from `kwargs`. Call before starting it."""
+    global _writer  # pylint: disable=global-statement
+    with _writer_lock:
+        if _writer is not None and _writer.running:
+            raise RuntimeError("Cannot reconfigure a running ingestion writer.")
+        _writer = IngestionWriter(**kwargs)
+        return _writer
+
+
+Callback("orchestralink_ingest_queue_depth", "Readings waiting for the ingestion writer.", (),
+         lambda: [((), get_ingestion_writer().stats()["queue_depth"])])
+Callback("orchestralink_ingest_spill_bytes", "Bytes of readings waiting in the spill buffer for replay.", (),
+         lambda: [((), get_ingestion_writer().stats().get("spill_pending_bytes", 0))])
+
+
+def start_ingestion_writer():
+    """Start the process-wide ingestion writer."""
+    writer = get_ingestion_writer()
+    writer.start()
+    return writer
+
+
+def stop_ingestion_writer(timeout=10):
+    """Flush pending readings and stop the process-wide ingestion writer."""
+    with _writer_lock:
+        writer = _writer
+    if writer is not None:
+        writer.stop(timeout)
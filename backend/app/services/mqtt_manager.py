@@ -2,72 +2,222 @@
 File contains MQTT logic.
 """
 
+import math
 import random
 import time
 import logging
 from datetime import datetime
-from sqlalchemy.exc import SQLAlchemyError
 from paho.mqtt.client import Client, MQTT_ERR_SUCCESS
 
-from app.config.database import Database
-from app.models.models import MachineData
-from app.services.data_manager import TOPICS, MACHINE_NAME
+from app.config.ingestion import SPILL_RETRY_INTERVAL
+from app.config.logging import PER_MESSAGE_LEVEL
+from app.config.mqtt import BATCH_TOPIC_FORMAT, MQTT_PAYLOAD_FORMAT, TOPIC_FORMAT
+from app.config.simulator import SIMULATOR_JITTER, SIMULATOR_MAX_BACKLOG, SIMULATOR_SPREAD, sample_rate
+from app.core.state_manager import update_latest
+from app.services.data_manager import get_machine_profile
+from app.services.ingestion import get_ingestion_writer
+from app.services.metrics import Counter, Histogram
+from app.services.payload import decode_batch, encode_batch, is_batch
+from app.services.scheduler import SampleScheduler
+from app.services.streaming import get_stream_hub
+from app.services.topic_router import TopicRouter
 
 logger = logging.getLogger(__name__)
 
+MESSAGES_RECEIVED = Counter("orchestralink_mqtt_messages_received_total", "MQTT messages handed to the ingestion callback.")
+MESSAGES_DECODED = Counter("orchestralink_mqtt_messages_decoded_total", "MQTT messages decoded into readings.")
+MESSAGES_FAILED = Counter("orchestralink_mqtt_messages_failed_total", "MQTT messages not ingested, by reason.", ("reason",))
+_FAILED_DECODE = MESSAGES_FAILED.labels("decode")
+_FAILED_QUEUE_FULL = MESSAGES_FAILED.labels("queue_full")
+_FAILED_UNROUTABLE = MESSAGES_FAILED.labels("unroutable")
+_FAILED_NON_FINITE = MESSAGES_FAILED.labels("non_finite")
+SEQUENCE_GAPS = Counter("orchestralink_mqtt_batch_sequence_gaps_total", "Binary batches missing from a topic's sequence.")
+PUBLISHED = Counter("orchestralink_publish_messages_total", "Readings published by the simulator, by result.", ("result",))
+_PUBLISH_SUCCESS = PUBLISHED.labels("success")
+_PUBLISH_FAILURE = PUBLISHED.labels("failure")
+PUBLISH_LAG = Histogram("orchestralink_publish_loop_lag_seconds", "How late each scheduled sample was published.")
+PUBLISH_SKIPPED = Counter("orchestralink_publish_samples_skipped_total", "Samples skipped by the simulator after falling behind.")
+
+# Last binary batch sequence number seen per topic.
+_last_sequences = {}
+# Which consumers readings are handed to; see configure_message_handling.
+_handling = {"store": True, "live": True, "check_sequence": True}
+# Created on first use; see get_topic_router.
+_router = None
+
+def get_topic_router():
+    """Return the router used by handle_mqtt_message."""
+    global _router  # pylint: disable=global-statement
+    if _router is None:
+        profile = get_machine_profile()
+        # Bare parameter topics of the legacy scheme are attributed to this process's machine.
+        _router = TopicRouter(default_machine=profile.name, units=profile.topics, retry_interval=SPILL_RETRY_INTERVAL)
+    return _router
+
+def configure_message_handling(store=True, live=True, check_sequence=True):
+    """
+    Choose what handle_mqtt_message does with each reading.
+
+    :param store: Queue readings for the ingestion writer.
+    :param live: Update the latest-value store and live streams of this process.
+    :param check_sequence: Count gaps in batch sequence numbers; meaningless when a
+                           shared subscription delivers only some of a topic's messages.
+    """
+    _handling.update(store=store, live=live, check_sequence=check_sequence)
+
 def handle_mqtt_message(client, userdata, msg):
-    """Handle incoming MQTT messages and store them in the database."""
+    """
+    Decode incoming MQTT messages and hand them to the batched ingestion writer.
+
+    The machine comes from the topic. Binary batches carry their own parameters
+    and producer timestamps; plain-text payloads are a single reading of the
+    topic's parameter, stamped on receipt.
+    """
+    MESSAGES_RECEIVED.inc()
     topic = msg.topic
+    payload = msg.payload
+    router = _router or get_topic_router()
+    route = router.route(topic)
+    if route is None:
+        _FAILED_UNROUTABLE.inc()
+        logger.warning("Discarding message on unroutable topic '%s'.", topic)
+        return
+
+    if is_batch(payload):
+        try:
+            batch = decode_batch(payload)
+        except ValueError as e:
+            _FAILED_DECODE.inc()
+            logger.error("Discarding malformed batch for topic '%s': %s", topic, e)
+            return
+        MESSAGES_DECODED.inc()
+        if _handling["check_sequence"]:
+            _check_sequence(topic, batch.sequence)
+        machine = route.machine
+        non_finite = 0
+        for parameter, value, timestamp in batch.readings():
+            if not math.isfinite(value):
+                non_finite += 1
+                continue
+            _ingest_reading(machine, parameter, value, router.series(machine, parameter).unit, timestamp)
+        if non_finite:
+            logger.warning("Discarded %d non-finite readings of a batch for topic '%s'.", non_finite, topic)
+        return
+
+    if route.parameter is None:
+        _FAILED_DECODE.inc()
+        logger.error("Discarding non-batch payload on batch topic '%s'.", topic)
+        return
     try:
-        # Decode message
-        message = float(msg.payload.decode())
-    except ValueError:
-        message = msg.payload.decode()
-
-    unit = TOPICS.get(topic, "")
-    timestamp = datetime.utcnow()
-
-    logger.info(f"Received data for topic '{topic}': {message} {unit}")
-
+        value = float(payload.decode())
+    except (UnicodeDecodeError, ValueError):
+        _FAILED_DECODE.inc()
+        logger.error("Discarding non-numeric payload for topic '%s': %r", topic, payload)
+        return
+    if not math.isfinite(value):
+        _FAILED_NON_FINITE.inc()
+        logger.error("Discarding non-finite reading for topic '%s': %r", topic, payload)
+        return
+    MESSAGES_DECODED.inc()
+    _ingest_reading(route.machine, route.parameter, value, route.unit, datetime.utcnow())
+
+def _check_sequence(topic, sequence):
+    """Count batches lost or reordered between consecutive sequence numbers of a topic."""
+    last = _last_sequences.get(topic)
+    _last_sequences[topic] = sequence
+    if last is not None and sequence != (last + 1) & 0xFFFFFFFF:
+        SEQUENCE_GAPS.inc()
+        logger.debug("Batch sequence gap on topic '%s': %s after %s", topic, sequence, last)
+
+def _ingest_reading(machine_name, topic, value, unit, timestamp):
+    """Queue one reading for storage and fan it out to the latest-value store and live streams."""
+    logger.log(PER_MESSAGE_LEVEL, "Received data for topic '%s': %s %s", topic, value, unit)
+
+    if _handling["store"] and not get_ingestion_writer().submit(machine_name, topic, value, unit, timestamp):
+        _FAILED_QUEUE_FULL.inc()
+        logger.warning("Ingestion queue full, dropping reading for topic '%s'.", topic)
+
+    if _handling["live"]:
+        update_latest(machine_name, topic, value, unit, timestamp)
+        get_stream_hub().publish(machine_name, topic, value, unit, timestamp)
+
+def _publish_batch(machine_name, readings, client: Client, sequence):
+    """Publish (parameter, value, timestamp) readings as a single binary batch."""
+    topic = BATCH_TOPIC_FORMAT.format(machine=machine_name)
+    try:
+        publish_result = client.publish(topic, encode_batch(readings, sequence))
+    except Exception as e:
+        logger.error("Unexpected error during publish to topic '%s': %s", topic, e)
+        return
+    if publish_result.rc != MQTT_ERR_SUCCESS:
+        _PUBLISH_FAILURE.inc(len(readings))
+        logger.error("Failed to publish to topic '%s'. MQTT error code: %s", topic, publish_result.rc)
+        return
+    _PUBLISH_SUCCESS.inc(len(readings))
+    logger.log(PER_MESSAGE_LEVEL, "Published batch %s of %d readings to topic '%s'.", sequence, len(readings), topic)
+
+def _publish_reading(topic, value, client: Client):
+    """Publish one reading as a plain-text float."""
     try:
-        with Database.get_session() as session:
-            # Insert the new entry
-            entry = MachineData.create_entry(session, MACHINE_NAME, topic, message, unit)
-            logger.info(f"Data inserted for topic '{topic}'. Entry ID: {entry.id} Timestamp: {entry.timestamp}")
-    except SQLAlchemyError as db_error:
-        logger.error(f"Database error while inserting data for topic '{topic}': {db_error}")
-        session.rollback()
+        # Publish data to MQTT topic
+        publish_result = client.publish(topic, value)
     except Exception as e:
-        logger.error(f"Unexpected error while handling MQTT message for topic '{topic}': {e}")
-
-def publish_data(machine_name, machine_parameters, client: Client):
-    """Continuously publish random data to MQTT topics and log it in the database."""
-    while True:
-        for topic, param_info in machine_parameters.items():
-            value = random.uniform(*param_info["range"])
-            unit = param_info.get("unit", "")
-            timestamp = datetime.utcnow()
-
-            try:
-                # Publish data to MQTT topic
-                publish_result = client.publish(topic, value)
-                if publish_result.rc != MQTT_ERR_SUCCESS:
-                    logger.error(f"Failed to publish to topic '{topic}'. MQTT error code: {publish_result.rc}")
-                    continue
-
-                logger.info(f"Published data to topic '{topic}': {value}")
-
-                # Insert data into the database
-                with Database.get_session() as session:
-                    MachineData.create_entry(session, machine_name, topic, value, unit)
-                    logger.info(f"Data inserted for topic '{topic}' in the database.")
-            except SQLAlchemyError as db_error:
-                logger.error(f"Database error while inserting data for topic '{topic}': {db_error}")
-            except Exception as e:
-                logger.error(f"Unexpected error during publish to topic '{topic}': {e}")
-
-        # Sleep to simulate periodic data publishing
-        time.sleep(15)
+        logger.error("Unexpected error during publish to topic '%s': %s", topic, e)
+        return
+    if publish_result.rc != MQTT_ERR_SUCCESS:
+        _PUBLISH_FAILURE.inc()
+        logger.error("Failed to publish to topic '%s'. MQTT error code: %s", topic, publish_result.rc)
+        return
+    _PUBLISH_SUCCESS.inc()
+    logger.log(PER_MESSAGE_LEVEL, "Published data to topic '%s': %s", topic, value)
+
+def publish_data(machine_name, machine_parameters, client: Client, stop_event=None):
+    """
+    Publish random readings of every parameter at its own sample rate until `stop_event` is set.
+
+    Rates, phase spreading and jitter come from app/config/simulator.py; see
+    SampleScheduler for the timing. Binary payloads pack all samples due at
+    the same wake-up into one batch stamped with their scheduled times.
+    Nothing is written to the database here: readings are stored once, by the
+    ingestor that receives them (see handle_mqtt_message).
+    """
+    scheduler = SampleScheduler(spread=SIMULATOR_SPREAD, jitter=SIMULATOR_JITTER, max_backlog=SIMULATOR_MAX_BACKLOG)
+    started = time.monotonic()
+    # Converts scheduler (monotonic) deadlines to producer timestamps.
+    epoch = time.time() - started
+    for parameter in machine_parameters:
+        scheduler.add(parameter, sample_rate(parameter), started)
+    topics = {parameter: TOPIC_FORMAT.format(machine=machine_name, parameter=parameter)
+              for parameter in machine_parameters}
+    binary = MQTT_PAYLOAD_FORMAT == "binary"
+    sequence = skipped = 0
+
+    while stop_event is None or not stop_event.is_set():
+        due = scheduler.pop_due(time.monotonic())
+        readings = []
+        for parameter, deadline, lag in due:
+            PUBLISH_LAG.observe(lag)
+            value = random.uniform(*machine_parameters[parameter]["range"])
+            if binary:
+                readings.append((parameter, value, datetime.utcfromtimestamp(epoch + deadline)))
+            else:
+                _publish_reading(topics[parameter], value, client)
+        if readings:
+            _publish_batch(machine_name, readings, client, sequence)
+            sequence += 1
+
+        stats = scheduler.stats()
+        if stats["skipped"] > skipped:
+            PUBLISH_SKIPPED.inc(stats["skipped"] - skipped)
+            logger.warning("Simulator fell behind schedule, skipped %d samples.", stats["skipped"] - skipped)
+            skipped = stats["skipped"]
+
+        delay = scheduler.next_due() - time.monotonic()
+        if delay > 0:
+            if stop_event is None:
+                time.sleep(delay)
+            else:
+                stop_event.wait(delay)
 
 def setup_mqtt():
     """Configure and return an MQTT client with reconnection logic."""
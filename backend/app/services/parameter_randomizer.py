@@ -1,56 +1,121 @@
 """
 File containing parameter logic.
+
+Values follow a smoothed random walk: each step moves the walk by up to
+±data_margin, and the emitted value averages `data_sample` jittered copies
+of the walk's position; the jitter never feeds back into the walk. The
+batch API below computes whole (machines × parameters × timesteps) blocks at
+once with NumPy; every generator owns its random state and walk position, so
+separate generators can be used from separate threads.
 """
 
-import random
+import logging
+import numpy as np
 
 from app.config.machine_parameters import GLOBAL_PARAMETERS
 
-state = {}
+logger = logging.getLogger(__name__)
 
-def clear_old_state():
-    """Clear the state dictionary."""
-    global state # pylint: disable=W0602
-    state.clear()
 
-def get_random_parameters(max_params=4, data_sample=5, data_margin=0.03, previous_values=None):
-    """Function picking and generating smooth parameters for machines."""
-    param_names = list(GLOBAL_PARAMETERS.keys())
-    selected_params = random.sample(param_names, min(max_params, len(param_names)))
-    print(f"Selected parameters: {selected_params}")
+class RandomWalkGenerator:
+    """Reproducible, vectorized smoothed random walks for many machines and parameters."""
 
-    smooth_params = {}
-    clear_old_state()
+    def __init__(self, ranges, data_sample=5, data_margin=0.03, seed=None, initial=None):
+        """
+        :param ranges: Array-like of shape (machines, parameters, 2) holding (min, max) per series.
+        :param data_sample: Number of jittered samples averaged per step (at least 1).
+        :param data_margin: Maximum relative change per step and per sample.
+        :param seed: Seed for the generator's private NumPy random state.
+        :param initial: Optional (machines, parameters) starting values; drawn uniformly within range otherwise.
+        """
+        if data_sample < 1:
+            raise ValueError(f"data_sample must be at least 1, got {data_sample}.")
+        self.ranges = np.asarray(ranges, dtype=np.float64)
+        self.low = self.ranges[..., 0]
+        self.high = self.ranges[..., 1]
+        self.data_sample = data_sample
+        self.data_margin = data_margin
+        self._rng = np.random.default_rng(seed)
+        if initial is None:
+            initial = self._rng.uniform(self.low, self.high)
+        self.state = np.asarray(initial, dtype=np.float64).copy()
+
+    @property
+    def shape(self):
+        """Return (machines, parameters)."""
+        return self.state.shape
+
+    def next_batch(self, timesteps, rows=None):
+        """
+        Advance the walk and return the next `timesteps` values per series.
+
+        :param rows: Optional machine indices to advance; other machines keep their position.
+        :return: Array of shape (machines or len(rows), parameters, timesteps), rounded to 2 decimals
+                 and clipped to each parameter's range.
+        """
+        rows = slice(None) if rows is None else np.asarray(rows)
+        state, low, high = self.state[rows], self.low[rows], self.high[rows]
+        margin = self.data_margin
+        size = state.shape + (timesteps,)
 
-    for param in selected_params:
-        print(f"Processing parameter: {param}")
-        param_info = GLOBAL_PARAMETERS[param]
-        min_val, max_val = param_info["range"]
+        # Mean of data_sample jittered copies, the first of which is the unjittered base value.
+        jitter = np.zeros(size)
+        for _ in range(self.data_sample - 1):
+            jitter += self._rng.uniform(-margin, margin, size)
+        jitter /= self.data_sample
 
-        if previous_values and param in previous_values:
-            base_value = previous_values[param]['value']
-            value = base_value + base_value * random.uniform(-data_margin, data_margin)
-        else:
-            value = random.uniform(min_val, max_val)
+        walk = state[..., None] * np.cumprod(1.0 + self._rng.uniform(-margin, margin, size), axis=-1)
+        np.clip(walk, low[..., None], high[..., None], out=walk)
+        self.state[rows] = walk[..., -1]
 
-        values = [value]
+        values = walk * (1.0 + jitter)
+        np.clip(values, low[..., None], high[..., None], out=values)
+        np.round(values, 2, out=values)
+        return values
 
-        for _ in range(data_sample - 1):
-            variation = value * random.uniform(-data_margin, data_margin)
-            variation_value = value + variation
-            values.append(variation_value)
-            print(f"Generated variation: {variation_value:.2f}")
 
-        average_value = round(sum(values) / len(values), 2)
-        print(f"Average value for {param}: {average_value}")
+def generate_parameter_batch(parameters, machines, timesteps, data_sample=5, data_margin=0.03, seed=None):
+    """
+    Generate smoothed random-walk samples for `machines` machines sharing the same parameters.
 
-        unit = param_info.get('unit', '')
+    :param parameters: Parameter names from GLOBAL_PARAMETERS.
+    :return: Array of shape (machines, len(parameters), timesteps).
+    """
+    ranges = [GLOBAL_PARAMETERS[param]["range"] for param in parameters]
+    generator = RandomWalkGenerator(
+        np.broadcast_to(ranges, (machines, len(ranges), 2)),
+        data_sample=data_sample, data_margin=data_margin, seed=seed,
+    )
+    return generator.next_batch(timesteps)
+
+
+def get_random_parameters(max_params=4, data_sample=5, data_margin=0.03, previous_values=None, seed=None):
+    """Function picking and generating smooth parameters for machines."""
+    rng = np.random.default_rng(seed)
+    param_names = list(GLOBAL_PARAMETERS.keys())
+    selected_params = [str(p) for p in rng.choice(param_names, min(max_params, len(param_names)), replace=False)]
+    logger.debug(f"Selected parameters: {selected_params}")
+
+    ranges = [GLOBAL_PARAMETERS[param]["range"] for param in selected_params]
+    initial = None
+    if previous_values:
+        initial = [
+            previous_values[param]["value"] if param in previous_values else rng.uniform(*value_range)
+            for param, value_range in zip(selected_params, ranges)
+        ]
+    generator = RandomWalkGenerator(
+        [ranges], data_sample=data_sample, data_margin=data_margin,
+        seed=rng.integers(2 ** 63), initial=None if initial is None else [initial],
+    )
+    values = generator.next_batch(1)[0, :, 0]
+
+    smooth_params = {}
+    for param, value_range, value in zip(selected_params, ranges, values):
         smooth_params[param] = {
-            'value': average_value,
-            'unit': unit,
-            'range': (min_val, max_val)
+            'value': float(value),
+            'unit': GLOBAL_PARAMETERS[param].get('unit', ''),
+            'range': tuple(value_range),
         }
 
-    print("Final smoothed parameters:")
-    print(smooth_params)
+    logger.debug(f"Final smoothed parameters: {smooth_params}")
     return smooth_params
@@ -0,0 +1,142 @@
+"""
+File contains MQTT payload encoding logic.
+
+Besides the original plain-text payload (one float per message, stamped with
+the receiver's clock), readings can be sent as a versioned binary batch that
+carries many parameters and samples with producer timestamps:
+
+    header      <2sBBIqHB  magic, version, flags, sequence, base timestamp (µs
+                           since the Unix epoch), sample count, parameter count
+    parameters  per parameter: name length (B) followed by the UTF-8 name
+    samples     SAMPLE_DTYPE records: offset from the base timestamp (µs),
+                parameter index, reserved, value (float64)
+
+Samples are decoded with np.frombuffer over a memoryview of the payload, so
+the sample block is never copied.
+"""
+
+import struct
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+MAGIC = b"\xb7\x4c"
+VERSION = 1
+HEADER = struct.Struct("<2sBBIqHB")
+SAMPLE_DTYPE = np.dtype([("offset_us", "<u4"), ("parameter", "<u2"), ("reserved", "<u2"), ("value", "<f8")])
+MAX_SAMPLES = 0xFFFF
+MAX_OFFSET_US = 0xFFFFFFFF
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# Range of timestamps datetime can represent, in µs since the Unix epoch.
+MIN_TIMESTAMP_US = (datetime.min - EPOCH) // _MICROSECOND
+MAX_TIMESTAMP_US = (datetime.max - EPOCH) // _MICROSECOND
+
+
+class Batch(namedtuple("Batch", ["sequence", "base_us", "parameters", "samples"])):
+    """A decoded binary payload; `samples` is a read-only view into the payload."""
+
+    __slots__ = ()
+
+    def readings(self):
+        """Return [(parameter, value, timestamp)] in payload order."""
+        names = self.parameters
+        base = EPOCH + timedelta(microseconds=self.base_us)
+        return [
+            (names[index], value, base + timedelta(microseconds=offset))
+            for offset, index, value in zip(
+                self.samples["offset_us"].tolist(), self.samples["parameter"].tolist(), self.samples["value"].tolist()
+            )
+        ]
+
+
+def is_batch(payload):
+    """Whether `payload` is a binary batch rather than a plain-text reading."""
+    return payload[:2] == MAGIC
+
+
+def to_micros(timestamp):
+    """Microseconds since the Unix epoch of a naive UTC datetime."""
+    return (timestamp - EPOCH) // _MICROSECOND
+
+
+def encode_samples(parameters, timestamps_us, parameter_indexes, values, sequence=0):
+    """
+    Encode samples given as parallel arrays.
+
+    :param parameters: Parameter names referenced by `parameter_indexes`.
+    :param timestamps_us: Producer timestamps in microseconds since the Unix epoch.
+    """
+    timestamps_us = np.asarray(timestamps_us, dtype=np.int64)
+    count = timestamps_us.size
+    if count > MAX_SAMPLES:
+        raise ValueError(f"A batch holds at most {MAX_SAMPLES} samples, got {count}.")
+    if len(parameters) > 0xFF:
+        raise ValueError("A batch holds at most 255 parameters.")
+
+    base_us = int(timestamps_us.min()) if count else 0
+    offsets = timestamps_us - base_us
+    if count and offsets.max() > MAX_OFFSET_US:
+        raise ValueError("Samples in one batch must lie within ~71 minutes of each other.")
+
+    samples = np.zeros(count, dtype=SAMPLE_DTYPE)
+    samples["offset_us"] = offsets
+    samples["parameter"] = parameter_indexes
+    samples["value"] = values
+
+    table = bytearray()
+    for name in parameters:
+        encoded = name.encode()
+        table.append(len(encoded))
+        table += encoded
+    header = HEADER.pack(MAGIC, VERSION, 0, sequence & 0xFFFFFFFF, base_us, count, len(parameters))
+    return b"".join((header, bytes(table), samples.tobytes()))
+
+
+def encode_batch(readings, sequence=0):
+    """Encode [(parameter, value, timestamp)] readings into one binary payload."""
+    parameters, indexes = [], {}
+    parameter_indexes, values, timestamps_us = [], [], []
+    for parameter, value, timestamp in readings:
+        index = indexes.get(parameter)
+        if index is None:
+            index = indexes[parameter] = len(parameters)
+            parameters.append(parameter)
+        parameter_indexes.append(index)
+        values.append(value)
+        timestamps_us.append(to_micros(timestamp))
+    return encode_samples(parameters, timestamps_us, parameter_indexes, values, sequence)
+
+
+def decode_batch(payload):
+    """Decode a binary payload. Raises ValueError if it is malformed or of an unknown version."""
+    view = memoryview(payload)
+    if len(view) < HEADER.size:
+        raise ValueError("Truncated batch header.")
+    magic, version, _, sequence, base_us, count, parameter_count = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("Not a binary batch payload.")
+    if version != VERSION:
+        raise ValueError(f"Unsupported batch payload version {version}.")
+
+    offset = HEADER.size
+    parameters = []
+    try:
+        for _ in range(parameter_count):
+            length = view[offset]
+            parameters.append(bytes(view[offset + 1:offset + 1 + length]).decode())
+            offset += 1 + length
+    except (IndexError, UnicodeDecodeError) as e:
+        raise ValueError("Malformed parameter table.") from e
+
+    if len(view) - offset != count * SAMPLE_DTYPE.itemsize:
+        raise ValueError("Sample block does not match the sample count.")
+    samples = np.frombuffer(view, dtype=SAMPLE_DTYPE, count=count, offset=offset)
+    if count and int(samples["parameter"].max()) >= parameter_count:
+        raise ValueError("Sample references an unknown parameter.")
+    last_us = base_us + (int(samples["offset_us"].max()) if count else 0)
+    if base_us < MIN_TIMESTAMP_US or last_us > MAX_TIMESTAMP_US:
+        raise ValueError("Sample timestamps are out of range.")
+    return Batch(sequence, base_us, parameters, samples)
@@ -0,0 +1,85 @@
+"""
+File contains rollup backfill logic.
+
+Usage:
+    python -m app.services.rollups backfill [--from 2026-01-01] [--to 2026-02-01]
+
+Rollups are kept current by every write through MachineData.bulk_create; the
+backfill rebuilds them from raw machine_data, e.g. after a legacy migration.
+"""
+
+import argparse
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+
+from app.config.database import Database
+from app.models.models import EPOCH, ROLLUPS, MachineData
+from app.services.aggregation import bucket_query
+
+logger = logging.getLogger(__name__)
+
+# Raw data is re-aggregated one day at a time; a day is a whole number of every rollup bucket.
+BACKFILL_CHUNK = timedelta(days=1)
+
+
+def backfill_rollups(session, start=None, end=None):
+    """
+    Rebuild every rollup table from raw rows between `start` and `end`.
+
+    Each day is aggregated in SQL at the finest rollup resolution, coarsened in
+    Python for the others, and written with replace semantics in its own
+    transaction. Returns the number of finest-resolution buckets written.
+    """
+    if start is None or end is None:
+        first, last = session.execute(select(func.min(MachineData.timestamp), func.max(MachineData.timestamp))).one()
+        if first is None:
+            logger.info("No raw machine data to backfill.")
+            return 0
+        start = start or first
+        end = end or last + timedelta(seconds=1)
+
+    finest = ROLLUPS[0]
+    day = EPOCH + timedelta(days=(start - EPOCH).days)
+    written = 0
+    while day < end:
+        chunk_end = day + BACKFILL_CHUNK
+        aggregates = {
+            (series_id, EPOCH + timedelta(seconds=int(bucket) * finest.RESOLUTION)): [low, high, total, count, last, last_ts]
+            for series_id, bucket, low, high, total, count, last, last_ts
+            in session.execute(bucket_query(session, day, chunk_end, finest.RESOLUTION))
+        }
+        for rollup in ROLLUPS:
+            if rollup is not finest:
+                aggregates = rollup.coarsen(aggregates)
+            rollup.merge(session, aggregates, replace=True)
+            if rollup is finest:
+                written += len(aggregates)
+        session.commit()
+        logger.info(f"Backfilled rollups for {day:%Y-%m-%d}.")
+        day = chunk_end
+
+    logger.info(f"Rollup backfill finished: {written} buckets written.")
+    return written
+
+
+def main():
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Maintain machine data rollup tables.")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--from", dest="start", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    Database.initialize(args.database_url)
+    session = Database.get_session()
+    try:
+        backfill_rollups(session, args.start, args.end)
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+File contains sampling scheduler logic.
+
+Every series (a parameter, or a whole machine) is sampled at its own rate on
+absolute deadlines: sample n of a series is due at origin + n * period, so
+late wake-ups and slow publishes delay single samples but never add up to
+drift. Origins are spread over each series' period so that series sharing a
+rate do not fire together, and optional jitter delays each sample by a
+random fraction of its period without moving the deadlines after it.
+
+The scheduler never sleeps itself: callers pass the current time of their
+clock (time.monotonic, or the event loop's time) and wait until
+next_due() on their own, so it serves threads and asyncio alike.
+"""
+
+import heapq
+import math
+import random
+
+
+class SampleScheduler:
+    """Deadline heap of periodic series with drift-free deadlines and lag statistics."""
+
+    def __init__(self, spread=True, jitter=0.0, max_backlog=1.0, seed=None):
+        """
+        :param spread: Start every series at a random phase of its period instead of all at once.
+        :param jitter: Delay each sample by up to this fraction of its period (0 disables jitter).
+        :param max_backlog: Seconds a series may fall behind before its missed samples are
+                            skipped instead of being published in a burst.
+        """
+        if not 0.0 <= jitter < 1.0:
+            raise ValueError("jitter must be in [0, 1).")
+        self.spread = spread
+        self.jitter = jitter
+        self.max_backlog = max_backlog
+        self._rng = random.Random(seed)
+        # key -> [origin, period, n], n being the index of the series' next sample.
+        self._series = {}
+        # (time the sample is released, insertion order, key, deadline) entries.
+        self._heap = []
+        self._order = 0
+        self._stats = {"ticks": 0, "skipped": 0, "total_lag": 0.0, "max_lag": 0.0}
+
+    def __len__(self):
+        return len(self._series)
+
+    def add(self, key, rate, now):
+        """
+        Schedule series `key` at `rate` samples per second from `now` on.
+
+        :raises ValueError: If the rate is not positive or the key is already scheduled.
+        """
+        if not rate > 0:
+            raise ValueError(f"Sample rate of {key!r} must be positive, got {rate}.")
+        if key in self._series:
+            raise ValueError(f"{key!r} is already scheduled.")
+        period = 1.0 / rate
+        origin = now + (self._rng.uniform(0, period) if self.spread else 0.0)
+        self._series[key] = [origin, period, 0]
+        self._push(key, origin, period)
+
+    def remove(self, key):
+        """Stop scheduling series `key`; its queued sample is dropped lazily."""
+        self._series.pop(key, None)
+
+    def _push(self, key, deadline, period):
+        release = deadline + self._rng.uniform(0, self.jitter * period) if self.jitter else deadline
+        self._order += 1
+        heapq.heappush(self._heap, (release, self._order, key, deadline))
+
+    def next_due(self):
+        """Return the time the next sample is due, or None when nothing is scheduled."""
+        heap = self._heap
+        while heap and heap[0][2] not in self._series:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_due(self, now, limit=None):
+        """
+        Return the samples due at `now` as (key, deadline, lag) tuples, oldest first,
+        and schedule the next sample of each.
+
+        `deadline` is the sample's nominal time (without jitter) and `lag` how long
+        after its release the sample is taken. A series more than max_backlog
+        behind yields this one sample and resumes at its first deadline after `now`.
+
+        :param limit: Return at most this many samples; the rest stay due.
+        """
+        heap, series, stats = self._heap, self._series, self._stats
+        due = []
+        while heap and heap[0][0] <= now and (limit is None or len(due) < limit):
+            release, _, key, deadline = heapq.heappop(heap)
+            state = series.get(key)
+            if state is None:
+                continue
+            lag = now - release
+            due.append((key, deadline, lag))
+            stats["ticks"] += 1
+            stats["total_lag"] += lag
+            if lag > stats["max_lag"]:
+                stats["max_lag"] = lag
+
+            origin, period, n = state
+            n += 1
+            if lag > self.max_backlog:
+                resume = max(n, math.floor((now - origin) / period) + 1)
+                stats["skipped"] += resume - n
+                n = resume
+            state[2] = n
+            # Computed from the origin rather than by adding periods, so rounding never accumulates.
+            self._push(key, origin + n * period, period)
+        return due
+
+    def stats(self):
+        """Return {"series", "ticks", "skipped", "mean_lag", "max_lag"}; lags are in seconds."""
+        stats = self._stats
+        return {
+            "series": len(self._series),
+            "ticks": stats["ticks"],
+            "skipped": stats["skipped"],
+            "mean_lag": stats["total_lag"] / stats["ticks"] if stats["ticks"] else 0.0,
+            "max_lag": stats["max_lag"],
+        }
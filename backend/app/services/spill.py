@@ -0,0 +1,227 @@
+"""
+File contains spill buffer logic.
+
+When the database is down or cannot keep up, the ingestion writer appends
+its batches to a local write-ahead buffer instead of dropping them, and
+replays them once the database recovers.
+
+The buffer is a directory of append-only segment files. Each record is
+
+    <II  body length, CRC-32 of the body
+    body <II  series table length, row count
+         series table: JSON list of [machine_name, topic, unit]
+         rows: ROW_DTYPE records (series index, timestamp µs, value)
+
+Segments are sealed once they reach `segment_bytes`; sealed segments are
+replayed oldest first and deleted when done. A `.pos` checkpoint next to the
+segment being replayed records how far replay got, so a restart does not
+write rows twice. Total size is capped at `max_bytes` by discarding the
+oldest segments.
+"""
+
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+
+from app.services.payload import EPOCH, to_micros
+
+logger = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct("<II")
+BODY_HEADER = struct.Struct("<II")
+ROW_DTYPE = np.dtype([("series", "<u4"), ("timestamp_us", "<i8"), ("value", "<f8")])
+SEGMENT_SUFFIX = ".wal"
+CHECKPOINT_SUFFIX = ".pos"
+
+
+def encode_rows(rows):
+    """Encode (machine_name, topic, value, unit, timestamp) rows into one record body."""
+    series, indexes = [], {}
+    data = np.empty(len(rows), dtype=ROW_DTYPE)
+    for position, (machine_name, topic, value, unit, timestamp) in enumerate(rows):
+        key = (machine_name, topic, unit)
+        index = indexes.get(key)
+        if index is None:
+            index = indexes[key] = len(series)
+            series.append(key)
+        data[position] = (index, to_micros(timestamp), np.nan if value is None else value)
+    table = json.dumps(series).encode()
+    return b"".join((BODY_HEADER.pack(len(table), len(rows)), table, data.tobytes()))
+
+
+def decode_rows(body):
+    """Decode a record body produced by encode_rows."""
+    view = memoryview(body)
+    table_length, count = BODY_HEADER.unpack_from(view)
+    offset = BODY_HEADER.size
+    series = json.loads(bytes(view[offset:offset + table_length]))
+    data = np.frombuffer(view, dtype=ROW_DTYPE, count=count, offset=offset + table_length)
+    # NaN stands in for a missing value (value != value only holds for NaN).
+    return [
+        (series[index][0], series[index][1], None if value != value else value, series[index][2],
+         EPOCH + timedelta(microseconds=timestamp))
+        for index, timestamp, value in zip(
+            data["series"].tolist(), data["timestamp_us"].tolist(), data["value"].tolist()
+        )
+    ]
+
+
+class SpillBuffer:
+    """Segment-rotated, CRC-checked, size-bounded append-only buffer of reading batches."""
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, max_bytes=1024 * 1024 * 1024, fsync=False):
+        """
+        :param fsync: fsync every record; survives power loss at the cost of one disk flush per batch.
+        """
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stats = {"records_written": 0, "rows_written": 0, "segments_discarded": 0,
+                       "bytes_discarded": 0, "records_corrupt": 0}
+
+        # Segments left by a previous run are sealed and replayed first.
+        self._sealed = sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+        self._sizes = {path: path.stat().st_size for path in self._sealed}
+        self._next_number = int(self._sealed[-1].stem) + 1 if self._sealed else 0
+        self._active = None
+        self._active_path = None
+        self._active_size = 0
+        if self._sealed:
+            logger.warning(f"Found {len(self._sealed)} spill segments ({self.pending_bytes()} bytes) to replay.")
+
+    def pending_bytes(self):
+        """Bytes buffered on disk, including the active segment."""
+        return sum(self._sizes.values()) + self._active_size
+
+    def has_pending(self):
+        return bool(self._sealed) or self._active_size > 0
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["segments"] = len(self._sealed) + (1 if self._active_size else 0)
+            snapshot["pending_bytes"] = self.pending_bytes()
+        return snapshot
+
+    def append(self, rows):
+        """Append one batch as a record. Raises OSError if the disk write fails."""
+        body = encode_rows(rows)
+        record = RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+        with self._lock:
+            if self._active is None or (self._active_size and self._active_size + len(record) > self.segment_bytes):
+                self._rotate()
+            self._active.write(record)
+            self._active.flush()
+            if self.fsync:
+                os.fsync(self._active.fileno())
+            self._active_size += len(record)
+            self._stats["records_written"] += 1
+            self._stats["rows_written"] += len(rows)
+            self._enforce_limit()
+
+    def _rotate(self):
+        """Seal the active segment (if it holds anything) and open a new one."""
+        if self._active is not None:
+            self._active.close()
+            if self._active_size:
+                self._sealed.append(self._active_path)
+                self._sizes[self._active_path] = self._active_size
+            else:
+                self._active_path.unlink()
+        self._active_path = self.directory / f"{self._next_number:010d}{SEGMENT_SUFFIX}"
+        self._next_number += 1
+        self._active = open(self._active_path, "ab")  # pylint: disable=consider-using-with
+        self._active_size = 0
+
+    def _enforce_limit(self):
+        while self._sealed and self.pending_bytes() > self.max_bytes:
+            oldest = self._sealed.pop(0)
+            size = self._sizes.pop(oldest)
+            self._delete(oldest)
+            self._stats["segments_discarded"] += 1
+            self._stats["bytes_discarded"] += size
+            logger.error(f"Spill buffer over {self.max_bytes} bytes, discarded segment {oldest.name} ({size} bytes).")
+
+    @staticmethod
+    def _delete(path):
+        for file in (path, path.with_suffix(CHECKPOINT_SUFFIX)):
+            try:
+                file.unlink()
+            except FileNotFoundError:
+                pass
+
+    def next_segment(self):
+        """Return the oldest segment to replay, sealing the active one if it is all that is left."""
+        with self._lock:
+            if not self._sealed and self._active_size:
+                self._rotate()
+            return self._sealed[0] if self._sealed else None
+
+    def records(self, path):
+        """
+        Yield (end offset, rows) for every intact record of a sealed segment after
+        its checkpoint. Stops at the first truncated or corrupt record.
+        """
+        checkpoint = path.with_suffix(CHECKPOINT_SUFFIX)
+        try:
+            offset = int(checkpoint.read_text() or 0)
+        except (FileNotFoundError, ValueError):
+            offset = 0
+        try:
+            handle = open(path, "rb")  # pylint: disable=consider-using-with
+        except FileNotFoundError:
+            return
+        with handle:
+            handle.seek(offset)
+            while True:
+                header = handle.read(RECORD_HEADER.size)
+                if not header:
+                    return
+                length, crc = RECORD_HEADER.unpack(header) if len(header) == RECORD_HEADER.size else (-1, 0)
+                body = handle.read(length) if length >= 0 else b""
+                if len(body) != length or zlib.crc32(body) != crc:
+                    with self._lock:
+                        self._stats["records_corrupt"] += 1
+                    logger.error(f"Corrupt or truncated record in spill segment {path.name} at byte {offset}; "
+                                 f"skipping the rest of the segment.")
+                    return
+                offset += RECORD_HEADER.size + len(body)
+                yield offset, decode_rows(body)
+
+    @staticmethod
+    def commit(path, offset):
+        """Record that everything before `offset` in `path` has been replayed."""
+        try:
+            path.with_suffix(CHECKPOINT_SUFFIX).write_text(str(offset))
+        except FileNotFoundError:
+            pass
+
+    def remove(self, path):
+        """Delete a fully replayed segment."""
+        with self._lock:
+            if path in self._sizes:
+                self._sealed.remove(path)
+                del self._sizes[path]
+            self._delete(path)
+
+    def close(self):
+        with self._lock:
+            if self._active is not None:
+                self._active.close()
+                if not self._active_size:
+                    self._active_path.unlink()
+                else:
+                    self._sealed.append(self._active_path)
+                    self._sizes[self._active_path] = self._active_size
+                self._active = None
+                self._active_size = 0
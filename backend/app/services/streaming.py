@@ -0,0 +1,149 @@
+"""
+File contains live streaming logic.
+
+Readings handed over by the ingestion path are fanned out in-process to
+subscribed WebSocket/SSE clients. Each client owns a bounded buffer keyed by
+(machine, topic), so a slow consumer only ever receives the newest value per
+series instead of an ever-growing backlog.
+"""
+
+import asyncio
+import threading
+import logging
+from collections import deque
+
+from app.core.state_manager import get_latest
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of distinct series buffered for a single client.
+MAX_CLIENT_SERIES = 1024
+# Maximum number of readings waiting to be handed to the event loop.
+MAX_PENDING_READINGS = 100000
+
+
+def reading_to_dict(reading):
+    """Convert a (machine_name, topic, value, unit, timestamp) tuple to a JSON-friendly dict."""
+    machine_name, topic, value, unit, timestamp = reading
+    return {
+        "machine_name": machine_name,
+        "topic": topic,
+        "value": value,
+        "unit": unit,
+        "timestamp": timestamp.isoformat(),
+    }
+
+
+class Subscription:
+    """A single client's filter and coalescing send buffer. Used on the event loop only."""
+
+    def __init__(self, machines=None, topics=None, max_series=MAX_CLIENT_SERIES):
+        self.machines = frozenset(machines) if machines else None
+        self.topics = frozenset(topics) if topics else None
+        self.max_series = max_series
+        self.dropped = 0
+        self.coalesced = 0
+        self._buffer = {}
+        self._ready = asyncio.Event()
+
+    def update(self, machines=None, topics=None):
+        """Replace the client's machine/topic filters."""
+        self.machines = frozenset(machines) if machines else None
+        self.topics = frozenset(topics) if topics else None
+
+    def matches(self, machine_name, topic):
+        """Check whether a reading passes the client's filters."""
+        return ((self.machines is None or machine_name in self.machines)
+                and (self.topics is None or topic in self.topics))
+
+    def offer(self, reading):
+        """Buffer a reading, replacing any unsent value of the same series."""
+        key = (reading[0], reading[1])
+        if key in self._buffer:
+            self.coalesced += 1
+        elif len(self._buffer) >= self.max_series:
+            self.dropped += 1
+            return
+        self._buffer[key] = reading
+        self._ready.set()
+
+    async def next_batch(self, timeout=None):
+        """Wait for buffered readings and return them, or an empty list on timeout."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        batch, self._buffer = list(self._buffer.values()), {}
+        return batch
+
+
+class StreamHub:
+    """In-process fan-out of ingested readings to live subscribers."""
+
+    def __init__(self, max_pending=MAX_PENDING_READINGS):
+        self._loop = None
+        self._subscriptions = set()
+        self._pending = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    def bind_loop(self, loop):
+        """Attach the event loop that serves streaming clients."""
+        self._loop = loop
+
+    def publish(self, machine_name, topic, value, unit, timestamp):
+        """Schedule delivery of a reading to subscribers. Safe to call from any thread."""
+        if not self._subscriptions or self._loop is None:
+            return
+
+        self._pending.append((machine_name, topic, value, unit, timestamp))
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+        try:
+            self._loop.call_soon_threadsafe(self._dispatch)
+        except RuntimeError:
+            # The loop has been closed during shutdown.
+            self._scheduled = False
+
+    def _dispatch(self):
+        """Hand all pending readings to matching subscriptions. Runs on the event loop."""
+        with self._lock:
+            self._scheduled = False
+        pending = self._pending
+        subscriptions = tuple(self._subscriptions)
+        while pending:
+            reading = pending.popleft()
+            for subscription in subscriptions:
+                if subscription.matches(reading[0], reading[1]):
+                    subscription.offer(reading)
+
+    def snapshot(self, machines=None, topics=None):
+        """Return the latest known reading of every series passing the filters."""
+        return [
+            (machine_name, topic, latest.value, latest.unit, latest.timestamp)
+            for machine_name, series in get_latest().items() if not machines or machine_name in machines
+            for topic, latest in series.items() if not topics or topic in topics
+        ]
+
+    def subscribe(self, machines=None, topics=None):
+        """Register a new subscription. Must be called on the event loop."""
+        subscription = Subscription(machines, topics)
+        self._subscriptions.add(subscription)
+        logger.info(f"Stream client subscribed ({len(self._subscriptions)} active).")
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscription. Must be called on the event loop."""
+        self._subscriptions.discard(subscription)
+        logger.info(f"Stream client unsubscribed ({len(self._subscriptions)} active).")
+
+
+_hub = StreamHub()
+
+
+def get_stream_hub():
+    """Return the process-wide stream hub."""
+    return _hub
@@ -0,0 +1,112 @@
+"""
+File contains MQTT topic routing logic.
+
+Topics follow `machines/<machine>/<parameter>` (one plain-text reading) or
+`machines/<machine>/batch` (a binary batch, see app/services/payload.py).
+Each topic is parsed once; afterwards routing a message is a single dict
+lookup. A series seen for the first time is registered in the database, so
+new machines are picked up without a restart. While the database is down,
+registration is retried at most every `retry_interval` seconds per series so
+message handling does not stall on it.
+"""
+
+import logging
+import time
+from collections import namedtuple
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config.database import Database
+from app.config.machine_parameters import GLOBAL_PARAMETERS
+from app.config.mqtt import TOPIC_PREFIX, BATCH_PARAMETER
+from app.models.models import Series
+
+logger = logging.getLogger(__name__)
+
+# `parameter`, `unit` and `series_id` are None for batch topics; `series_id` is
+# None while the series could not be registered.
+Route = namedtuple("Route", ["machine", "parameter", "unit", "series_id"])
+
+
+class TopicRouter:
+    """Maps MQTT topics and (machine, parameter) pairs to cached routes."""
+
+    def __init__(self, default_machine=None, units=None, register=True, retry_interval=5.0):
+        """
+        :param default_machine: Machine for legacy single-level topics named after a parameter;
+                                such topics are unroutable when None.
+        :param units: Unit per parameter, on top of the units in GLOBAL_PARAMETERS.
+        :param register: Register unseen series in the database.
+        :param retry_interval: Seconds before retrying a series whose registration failed.
+        """
+        self.default_machine = default_machine
+        self.units = {param: details.get("unit", "") for param, details in GLOBAL_PARAMETERS.items()}
+        self.units.update(units or {})
+        self.register = register
+        self.retry_interval = retry_interval
+        self._routes = {}
+        self._series = {}
+        self._failed = {}
+
+    def route(self, topic):
+        """Return the Route of `topic`, or None if it does not follow the topic scheme."""
+        route = self._routes.get(topic)
+        if route is None:
+            route = self._compile(topic)
+        return route
+
+    def series(self, machine, parameter):
+        """Return the Route of one series, registering the series on first sight."""
+        route = self._series.get((machine, parameter))
+        if route is None:
+            failed = self._failed.get((machine, parameter))
+            if failed is not None and time.monotonic() < failed[1]:
+                return failed[0]
+            route = self._register(machine, parameter)
+        return route
+
+    def _compile(self, topic):
+        levels = topic.split("/")
+        if len(levels) == 3 and levels[0] == TOPIC_PREFIX and levels[1] and levels[2]:
+            machine, parameter = levels[1], levels[2]
+        elif len(levels) == 1 and self.default_machine is not None:
+            machine, parameter = self.default_machine, topic
+        else:
+            return None
+
+        if parameter == BATCH_PARAMETER:
+            route = Route(machine, None, None, None)
+        else:
+            route = self.series(machine, parameter)
+            if route.series_id is None and self.register:
+                # Not cached, so registration is retried with the next message.
+                return route
+        self._routes[topic] = route
+        return route
+
+    def _register(self, machine, parameter):
+        unit = self.units.get(parameter, "")
+        series_id = None
+        if self.register:
+            session = None
+            try:
+                session = Database.get_session()
+                series_id = Series.get_or_create_id(session, machine, parameter, unit)
+            except (SQLAlchemyError, RuntimeError) as e:
+                logger.warning(f"Could not register series '{parameter}' of machine '{machine}': {e}")
+                route = Route(machine, parameter, unit, None)
+                self._failed[(machine, parameter)] = (route, time.monotonic() + self.retry_interval)
+                return route
+            finally:
+                if session is not None:
+                    session.close()
+            logger.info(f"Routing series '{parameter}' of machine '{machine}' (series id {series_id}).")
+
+        self._failed.pop((machine, parameter), None)
+        route = self._series[(machine, parameter)] = Route(machine, parameter, unit, series_id)
+        return route
+
+    def clear(self):
+        """Forget every cached route."""
+        self._routes.clear()
+        self._series.clear()
+        self._failed.clear()
@@ -0,0 +1,82 @@
+"""
+In-process stand-ins for the MQTT broker and client used by the benchmarks.
+"""
+
+import queue
+import threading
+import time
+
+
+class FakeMessage:
+    """Mimics the attributes of paho.mqtt.client.MQTTMessage used by the ingestion path."""
+
+    __slots__ = ("topic", "payload", "qos", "retain", "published_at")
+
+    def __init__(self, topic, payload, published_at=None):
+        self.topic = topic
+        self.payload = payload
+        self.qos = 0
+        self.retain = False
+        self.published_at = published_at
+
+
+def topic_matches(topic_filter, topic):
+    """Match an MQTT topic against a filter with '+' and '#' wildcards."""
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels) or (level != "+" and level != topic_levels[i]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class FakeBroker:
+    """
+    A minimal broker delivering messages on its own network thread.
+
+    Like paho's loop thread, a slow on_message callback delays every message
+    queued behind it, so the benchmarks see the same back-pressure.
+    """
+
+    def __init__(self, max_queued=0):
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._subscriptions = []
+        self._thread = None
+        self.delivered = 0
+
+    def subscribe(self, topic_filter, callback, client=None, userdata=None):
+        """Register callback(client, userdata, msg) for topics matching topic_filter."""
+        self._subscriptions.append((topic_filter, callback, client, userdata))
+
+    def publish(self, topic, payload):
+        """
+        Queue a message for delivery and return it; payloads are encoded like
+        paho does for str/float, and published_at is the time.perf_counter() of the call.
+        """
+        if not isinstance(payload, (bytes, bytearray)):
+            payload = str(payload).encode()
+        message = FakeMessage(topic, payload, time.perf_counter())
+        self._queue.put(message)
+        return message
+
+    def start(self):
+        """Start the delivery thread."""
+        self._thread = threading.Thread(target=self._run, name="fake-broker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Deliver everything queued, then stop the delivery thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                return
+            for topic_filter, callback, client, userdata in self._subscriptions:
+                if topic_matches(topic_filter, message.topic):
+                    callback(client, userdata, message)
+            self.delivered += 1
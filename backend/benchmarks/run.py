@@ -0,0 +1,303 @@
+"""
+Self-contained ingest and API benchmarks.
+
+Runs on one machine without external services: an in-process fake broker
+drives handle_mqtt_message, readings go through the real batched ingestion
+writer, and a local SQLite file stands in for PostgreSQL unless
+--database-url points at a real server.
+
+Usage (from backend/):
+    python -m benchmarks.run
+    python -m benchmarks.run --scenarios ingest,api --rows 10000,1000000,10000000 --output bench.json
+    python -m benchmarks.run --baseline bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert
+
+from app.config.database import Database
+from app.models.migrations import create_schema
+from app.models.models import MachineData, Series
+from app.services.payload import encode_batch
+from benchmarks.fakes import FakeBroker
+
+SCENARIOS = ("ingest", "latency", "api")
+
+
+def percentiles(samples):
+    """Summarize latency samples in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples) * 1000.0
+    return {
+        "count": int(values.size),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p90_ms": float(np.percentile(values, 90)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def ingest_pipeline(**writer_kwargs):
+    """Start a fresh ingestion writer and a fake broker wired to handle_mqtt_message."""
+    # Imported here so the writer is configured before anything else can create it.
+    from app.services.ingestion import configure_ingestion_writer  # pylint: disable=import-outside-toplevel
+    from app.services.mqtt_manager import handle_mqtt_message  # pylint: disable=import-outside-toplevel
+    from app.services.data_manager import MACHINE_NAME, TOPICS  # pylint: disable=import-outside-toplevel
+    from app.config.mqtt import MQTT_SUBSCRIPTIONS, TOPIC_FORMAT  # pylint: disable=import-outside-toplevel
+
+    writer_kwargs.setdefault("spill_dir", None)  # measure the database, not the spill buffer
+    writer = configure_ingestion_writer(**writer_kwargs)
+    writer.start()
+    broker = FakeBroker()
+    for topic_filter in MQTT_SUBSCRIPTIONS:
+        broker.subscribe(topic_filter, handle_mqtt_message)
+    broker.start()
+    return writer, broker, [TOPIC_FORMAT.format(machine=MACHINE_NAME, parameter=param) for param in TOPICS]
+
+
+def bench_ingest(messages, payload="text", samples_per_message=1):
+    """
+    Maximum ingest rate: publish `messages` readings as fast as possible, then
+    wait for every row to be written. Payloads are encoded before timing starts;
+    binary payloads pack `samples_per_message` readings each.
+    """
+    # pylint: disable=import-outside-toplevel
+    from app.services.data_manager import MACHINE_NAME, TOPICS
+    from app.config.mqtt import BATCH_TOPIC_FORMAT
+
+    writer, broker, topics = ingest_pipeline()
+    if payload == "binary":
+        batch_topic = BATCH_TOPIC_FORMAT.format(machine=MACHINE_NAME)
+        parameters = list(TOPICS)
+        now = datetime.utcnow()
+        published = [
+            (batch_topic, encode_batch([
+                (parameters[i % len(parameters)], random.uniform(0, 100), now + timedelta(microseconds=i))
+                for i in range(offset, min(offset + samples_per_message, messages))
+            ], sequence))
+            for sequence, offset in enumerate(range(0, messages, samples_per_message))
+        ]
+    else:
+        published = [(topics[i % len(topics)], str(random.uniform(0, 100)).encode()) for i in range(messages)]
+
+    started = time.perf_counter()
+    for topic, data in published:
+        broker.publish(topic, data)
+    broker.stop()
+    delivered = time.perf_counter()
+    writer.stop()
+    finished = time.perf_counter()
+
+    stats = writer.stats()
+    return {
+        "messages": messages,
+        "payload": payload,
+        "mqtt_messages": len(published),
+        "callback_msgs_per_s": messages / (delivered - started),
+        "end_to_end_msgs_per_s": messages / (finished - started),
+        "rows_written": stats["rows_written"],
+        "rows_failed": stats["rows_failed"],
+        "dropped": stats["dropped"],
+        "batches": stats["batches"],
+        "avg_batch_size": stats["avg_batch_size"],
+        "avg_flush_ms": stats["avg_flush_seconds"] * 1000.0,
+        "max_flush_ms": stats["max_flush_seconds"] * 1000.0,
+    }
+
+
+def bench_latency(rate, duration):
+    """Publish-to-commit latency of each reading at a fixed publish rate."""
+    published = {}
+    committed = []
+
+    def record(batch, failed):
+        if not failed:
+            now = time.perf_counter()
+            committed.extend((row[2], now) for row in batch)
+
+    writer, broker, topics = ingest_pipeline(on_flush=record)
+    interval = 1.0 / rate
+    started = time.perf_counter()
+    total = int(rate * duration)
+    for i in range(total):
+        # Absolute deadlines keep the offered rate constant.
+        delay = started + i * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        # Readings are numbered so that each committed row maps back to its message.
+        published[float(i)] = broker.publish(topics[i % len(topics)], float(i)).published_at
+    broker.stop()
+    writer.stop()
+
+    latencies = [now - published[value] for value, now in committed]
+    return {"rate": rate, "duration_s": duration, "messages": total,
+            "publish_to_commit": percentiles(latencies)}
+
+
+def seed_rows(machine_name, rows, chunk=50000):
+    """Insert `rows` readings for one machine across four topics, one second apart."""
+    session = Database.get_session()
+    try:
+        topics = ["Torque", "Temperature", "BeltSpeed", "DrillingSpeed"]
+        series_ids = [Series.get_or_create_id(session, machine_name, topic, "u") for topic in topics]
+        origin = datetime(2026, 1, 1)
+        for offset in range(0, rows, chunk):
+            # Raw inserts only: rollups are not needed by the endpoints measured here.
+            session.execute(insert(MachineData), [
+                {"series_id": series_ids[i % 4], "timestamp": origin + timedelta(seconds=i), "value": float(i % 1000)}
+                for i in range(offset, min(offset + chunk, rows))
+            ])
+            session.commit()
+    finally:
+        session.close()
+    return origin, origin + timedelta(seconds=rows)
+
+
+def bench_api(row_counts, requests):
+    """Latency of GET /api/machine-data for machines with increasing history."""
+    from fastapi import FastAPI  # pylint: disable=import-outside-toplevel
+    from fastapi.testclient import TestClient  # pylint: disable=import-outside-toplevel
+    from app.api.routes import router  # pylint: disable=import-outside-toplevel
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    client = TestClient(app)
+    results = {}
+
+    for rows in row_counts:
+        machine_name = f"Bench-{rows}"
+        seed_started = time.perf_counter()
+        origin, end = seed_rows(machine_name, rows)
+        span = (end - origin).total_seconds()
+        result = {"seed_s": time.perf_counter() - seed_started}
+
+        def timed(params):
+            started = time.perf_counter()
+            response = client.get("/api/machine-data", params={"machine_name": machine_name, **params})
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise RuntimeError(f"Unexpected status {response.status_code}: {response.text[:200]}")
+            return elapsed, response.json()
+
+        def random_from():
+            return (origin + timedelta(seconds=random.uniform(0, max(span - 3600, 0)))).isoformat()
+
+        result["first_page"] = percentiles([timed({"limit": 1000})[0] for _ in range(requests)])
+        result["window_page"] = percentiles([
+            timed({"from": random_from(), "limit": 1000})[0] for _ in range(requests)
+        ])
+        result["topic_page"] = percentiles([
+            timed({"from": random_from(), "topic": "Torque", "limit": 1000})[0] for _ in range(requests)
+        ])
+
+        walk, cursor = [], None
+        for _ in range(requests):
+            elapsed, body = timed({"limit": 1000, **({"cursor": cursor} if cursor else {})})
+            walk.append(elapsed)
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        result["cursor_walk"] = percentiles(walk)
+        results[str(rows)] = result
+
+    return results
+
+
+def flatten(data, prefix=""):
+    """Flatten nested result dicts into {"a.b.c": number}."""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, current):
+    """Print the relative change of every shared numeric metric."""
+    old, new = flatten(baseline.get("scenarios", {})), flatten(current.get("scenarios", {}))
+    for name in sorted(old.keys() & new.keys()):
+        change = (new[name] - old[name]) / old[name] * 100.0 if old[name] else float("nan")
+        print(f"{name:60s} {old[name]:14.3f} -> {new[name]:14.3f} ({change:+.1f}%)", file=sys.stderr)
+
+
+def main():
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark ingestion and the machine data API.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--database-url", default=None,
+                        help="Database to benchmark against; a temporary SQLite file by default.")
+    parser.add_argument("--messages", type=int, default=100000, help="Readings for the ingest scenario.")
+    parser.add_argument("--payload", choices=["text", "binary"], default="text",
+                        help="MQTT payload format for the ingest scenario.")
+    parser.add_argument("--samples-per-message", type=int, default=100,
+                        help="Readings per binary payload in the ingest scenario.")
+    parser.add_argument("--rate", type=float, default=2000.0, help="Publish rate for the latency scenario.")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds for the latency scenario.")
+    parser.add_argument("--rows", default="10000,1000000", help="History sizes for the API scenario.")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per API measurement.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write JSON results here instead of stdout.")
+    parser.add_argument("--baseline", default=None, help="Previous JSON results to compare against.")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        Database.initialize(database_url)
+        create_schema(Database.get_engine())
+
+        results = {
+            "meta": {
+                "started_at": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "database": Database.get_engine().dialect.name,
+                "argv": sys.argv[1:],
+            },
+            "scenarios": {},
+        }
+        if "ingest" in scenarios:
+            results["scenarios"]["ingest"] = bench_ingest(args.messages, args.payload, args.samples_per_message)
+        if "latency" in scenarios:
+            results["scenarios"]["latency"] = bench_latency(args.rate, args.duration)
+        if "api" in scenarios:
+            row_counts = [int(value) for value in args.rows.split(",") if value]
+            results["scenarios"]["api"] = bench_api(row_counts, args.requests)
+
+        results["pools"] = Database.pool_stats()
+        Database.dispose()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            compare(json.load(handle), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Shared fixtures of the backend tests.
+
+Run from the repository root with the backend on the path:
+    PYTHONPATH=backend pytest backend/tests
+"""
+
+import pytest
+from sqlalchemy import delete
+
+from app.config.database import Database
+from app.models.migrations import create_schema
+from app.models.models import ROLLUPS, MachineData
+
+
+@pytest.fixture(scope="session")
+def database(tmp_path_factory):
+    """A SQLite database with the full schema, shared by the whole session."""
+    Database.configure(f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}")
+    create_schema(Database.get_engine())
+    yield Database
+    Database.dispose()
+
+
+@pytest.fixture
+def session(database):
+    """A session on an empty machine_data table; series rows and their cached ids are kept."""
+    session = database.get_session()
+    for table in (MachineData, *ROLLUPS):
+        session.execute(delete(table))
+    session.commit()
+    yield session
+    session.close()
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+import numpy as np
+
+from app.services.fleet import FleetSimulator, build_fleet
+from app.services.payload import decode_batch
+
+
+def run_fleet(duration, **kwargs):
+    published = []
+
+    def publish(topic, payload):
+        published.append((topic, payload))
+        return True
+
+    simulator = FleetSimulator(build_fleet(3, min_rate=20.0, max_rate=20.0, seed=1), publish, seed=1, **kwargs)
+    result = asyncio.run(simulator.run(duration))
+    return simulator, result, published
+
+
+def test_binary_ticks_are_stamped_on_the_schedule():
+    started = time.time()
+    _, result, published = run_fleet(0.5, payload="binary", samples_per_message=4)
+
+    assert result["failed"] == 0
+    assert result["published"] == sum(len(decode_batch(payload).samples) for _, payload in published)
+    for topic, payload in published:
+        batch = decode_batch(payload)
+        stamps = np.unique(batch.base_us + batch.samples["offset_us"].astype(np.int64))
+        # 20 Hz: consecutive ticks of one machine are one period apart (to the µs), whatever the loop's lag.
+        assert np.all(np.abs(np.diff(stamps) - 50000) <= 1), topic
+        assert started - 1 < stamps[0] / 1e6 < time.time() + 1
+
+
+def test_text_payloads_publish_every_parameter_of_every_tick():
+    simulator, result, published = run_fleet(0.3)
+
+    stats = simulator.stats()
+    assert result["published"] == len(published) == stats["ticks"] * 4
+    assert all(isinstance(payload, float) for _, payload in published)
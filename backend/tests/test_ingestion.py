@@ -0,0 +1,118 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError
+
+from app.models.models import MachineData
+from app.services.ingestion import IngestionWriter, is_connection_error
+from app.services.spill import SpillBuffer
+
+ORIGIN = datetime(2026, 1, 1)
+
+
+def reading(i, value=None):
+    return ("M1", "Torque", float(i) if value is None else value, "Nm", ORIGIN + timedelta(seconds=i))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def stored_values(session):
+    return session.execute(select(MachineData.value).order_by(MachineData.timestamp)).scalars().all()
+
+
+@pytest.fixture
+def make_writer(tmp_path):
+    writers = []
+
+    def make(**kwargs):
+        kwargs.setdefault("spill_dir", str(tmp_path / "spill"))
+        kwargs.setdefault("flush_interval", 0.01)
+        kwargs.setdefault("retry_interval", 0.05)
+        kwargs.setdefault("replay_rate", 0)
+        writer = IngestionWriter(**kwargs)
+        writers.append(writer)
+        return writer
+
+    yield make
+    for writer in writers:
+        writer.stop()
+
+
+@pytest.mark.parametrize("error, expected", [
+    (OperationalError("SELECT 1", None, Exception("server closed the connection")), True),
+    (DBAPIError("SELECT 1", None, Exception("gone"), connection_invalidated=True), True),
+    (IntegrityError("INSERT", None, Exception("NOT NULL constraint failed")), False),
+])
+def test_only_connection_errors_count_as_outages(error, expected):
+    assert is_connection_error(error) is expected
+
+
+def test_flush_writes_batches(session, make_writer):
+    writer = make_writer(batch_size=4)
+    writer.start()
+    for i in range(10):
+        assert writer.submit(*reading(i))
+    writer.stop()
+
+    assert writer.stats()["rows_written"] == 10
+    assert stored_values(session) == [float(i) for i in range(10)]
+
+
+def test_rejected_reading_is_discarded_alone(session, make_writer):
+    writer = make_writer(batch_size=8)
+    writer.start()
+    for i in range(8):
+        writer.submit(*reading(i, float("nan") if i == 3 else None))
+    writer.stop()
+
+    stats = writer.stats()
+    assert (stats["rows_written"], stats["rows_failed"], stats["rows_spilled"]) == (7, 1, 0)
+    assert stats["database_available"]
+    assert stored_values(session) == [float(i) for i in range(8) if i != 3]
+
+
+def test_outage_spills_and_replay_catches_up(session, make_writer, monkeypatch):
+    writer = make_writer(batch_size=5)
+    write = writer._write  # pylint: disable=protected-access
+
+    def unreachable(rows):
+        raise OperationalError("INSERT", None, Exception("connection refused"))
+
+    monkeypatch.setattr(writer, "_write", unreachable)
+    writer.start()
+    for i in range(5):
+        writer.submit(*reading(i))
+    wait_for(lambda: writer.stats()["rows_spilled"] == 5)
+    assert not writer.stats()["database_available"]
+
+    monkeypatch.setattr(writer, "_write", write)
+    wait_for(lambda: writer.stats()["rows_replayed"] == 5)
+    writer.stop()
+    assert writer.stats()["database_available"]
+    assert stored_values(session) == [float(i) for i in range(5)]
+
+
+def test_replay_skips_rows_the_database_rejects(session, make_writer, tmp_path):
+    spill = SpillBuffer(tmp_path / "spill")
+    # A missing value, as spilled by earlier versions, violates machine_data.value NOT NULL.
+    spill.append([reading(0), ("M1", "Torque", None, "Nm", ORIGIN + timedelta(seconds=1)), reading(2)])
+    spill.append([reading(3)])
+    spill.close()
+
+    writer = make_writer()
+    writer.start()
+    wait_for(lambda: writer.stats()["rows_replayed"] == 3)
+    writer.stop()
+
+    stats = writer.stats()
+    assert stats["rows_failed"] == 1
+    assert stats["database_available"]
+    assert stored_values(session) == [0.0, 2.0, 3.0]
+    assert not SpillBuffer(tmp_path / "spill").has_pending()
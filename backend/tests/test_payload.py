@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.payload import (
+    HEADER, MAGIC, MAX_TIMESTAMP_US, SAMPLE_DTYPE, VERSION, decode_batch, encode_batch, encode_samples, is_batch,
+    to_micros,
+)
+
+
+def raw_batch(base_us, offsets, parameters=("Torque",), sequence=0, version=VERSION):
+    """Assemble a payload by hand, bypassing encode_samples' checks."""
+    samples = np.zeros(len(offsets), dtype=SAMPLE_DTYPE)
+    samples["offset_us"] = offsets
+    table = b"".join(bytes([len(name)]) + name.encode() for name in parameters)
+    header = HEADER.pack(MAGIC, version, 0, sequence, base_us, len(offsets), len(parameters))
+    return header + table + samples.tobytes()
+
+
+def test_round_trip_keeps_order_values_and_microseconds():
+    origin = datetime(2026, 3, 1, 12, 0, 0, 123456)
+    readings = [
+        ("Torque", 1.5, origin),
+        ("Temperature", -40.25, origin + timedelta(microseconds=1)),
+        ("Torque", 2.5, origin + timedelta(minutes=70)),
+    ]
+    payload = encode_batch(readings, sequence=7)
+
+    assert is_batch(payload)
+    batch = decode_batch(payload)
+    assert batch.sequence == 7
+    assert batch.base_us == to_micros(origin)
+    assert batch.readings() == readings
+
+
+def test_sequence_wraps_at_32_bits():
+    assert decode_batch(encode_batch([("Torque", 1.0, datetime(2026, 1, 1))], sequence=2 ** 32 + 3)).sequence == 3
+
+
+def test_empty_batch():
+    batch = decode_batch(encode_samples([], [], [], []))
+    assert batch.readings() == []
+
+
+def test_plain_text_is_not_a_batch():
+    assert not is_batch(b"42.0")
+
+
+def test_encode_rejects_samples_too_far_apart():
+    with pytest.raises(ValueError):
+        encode_samples(["Torque"], [0, 2 ** 32], [0, 0], [1.0, 2.0])
+
+
+@pytest.mark.parametrize("payload", [
+    MAGIC + b"\x01",
+    b"xx" + raw_batch(0, [0])[2:],
+    raw_batch(0, [0], version=VERSION + 1),
+    raw_batch(0, [0])[:-1],
+    raw_batch(0, [0]) + b"\x00",
+    raw_batch(0, [0], parameters=()),
+    HEADER.pack(MAGIC, VERSION, 0, 0, 0, 0, 1) + b"\x05ab",
+])
+def test_malformed_payloads_raise_value_error(payload):
+    with pytest.raises(ValueError):
+        decode_batch(payload)
+
+
+@pytest.mark.parametrize("base_us, offsets", [
+    (2 ** 62, [1]),
+    (-(2 ** 62), [1]),
+    (MAX_TIMESTAMP_US, [1]),
+])
+def test_timestamps_beyond_datetime_raise_value_error(base_us, offsets):
+    with pytest.raises(ValueError):
+        decode_batch(raw_batch(base_us, offsets))
+
+
+def test_latest_representable_timestamp_decodes():
+    batch = decode_batch(raw_batch(MAX_TIMESTAMP_US - 1, [1]))
+    assert batch.readings()[0][2] == datetime.max
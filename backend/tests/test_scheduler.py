@@ -0,0 +1,102 @@
+import pytest
+
+from app.services.scheduler import SampleScheduler
+
+
+def drain(scheduler, until, step):
+    """Pop everything due while a clock advances from 0 in `step` increments, then at `until`."""
+    due = []
+    for tick in range(int(until / step) + 1):
+        due.extend(scheduler.pop_due(tick * step))
+    due.extend(scheduler.pop_due(until))
+    return due
+
+
+def test_deadlines_do_not_drift():
+    scheduler = SampleScheduler(spread=False)
+    scheduler.add("a", 10.0, 0.0)
+    # A coarse, irregular clock: every wake-up is late, but the deadlines stay on the grid.
+    deadlines = [deadline for _, deadline, _ in drain(scheduler, 100.0, 0.37)]
+
+    assert len(deadlines) == 1001
+    assert deadlines == [n * 0.1 for n in range(1001)]
+
+
+def test_series_fire_oldest_first_at_their_own_rates():
+    scheduler = SampleScheduler(spread=False)
+    scheduler.add("slow", 1.0, 0.0)
+    scheduler.add("fast", 4.0, 0.0)
+    due = scheduler.pop_due(1.0)
+
+    assert [key for key, _, _ in due].count("fast") == 5
+    assert [key for key, _, _ in due].count("slow") == 2
+    assert [deadline for _, deadline, _ in due] == sorted(deadline for _, deadline, _ in due)
+    assert scheduler.next_due() == pytest.approx(1.25)
+
+
+def test_limit_leaves_the_rest_due():
+    scheduler = SampleScheduler(spread=False)
+    for key in range(5):
+        scheduler.add(key, 1.0, 0.0)
+
+    assert len(scheduler.pop_due(0.0, limit=3)) == 3
+    assert len(scheduler.pop_due(0.0)) == 2
+
+
+def test_spread_starts_within_one_period():
+    scheduler = SampleScheduler(spread=True, seed=1)
+    for key in range(100):
+        scheduler.add(key, 2.0, 10.0)
+
+    first = scheduler.pop_due(10.5)
+    assert len(first) == 100
+    assert all(10.0 <= deadline <= 10.5 for _, deadline, _ in first)
+    assert len({deadline for _, deadline, _ in first}) > 1
+
+
+def test_jitter_delays_release_but_not_deadlines():
+    scheduler = SampleScheduler(spread=False, jitter=0.5, seed=3)
+    scheduler.add("a", 1.0, 0.0)
+    due = drain(scheduler, 50.0, 0.01)
+
+    assert [deadline for _, deadline, _ in due] == [float(n) for n in range(len(due))]
+    assert len(due) >= 50
+    # Lags are measured from the jittered release, so they stay small even though releases move.
+    assert max(lag for _, _, lag in due) < 0.02
+
+
+def test_falling_behind_skips_instead_of_bursting():
+    scheduler = SampleScheduler(spread=False, max_backlog=1.0)
+    scheduler.add("a", 10.0, 0.0)
+    scheduler.pop_due(0.0)
+    due = scheduler.pop_due(5.0)
+
+    assert len(due) == 1
+    # Samples 2 to 50 were missed; the next one is the first deadline after now.
+    assert scheduler.stats()["skipped"] == 49
+    assert scheduler.next_due() == pytest.approx(5.1)
+
+
+def test_removed_series_stop_firing():
+    scheduler = SampleScheduler(spread=False)
+    scheduler.add("a", 1.0, 0.0)
+    scheduler.add("b", 1.0, 0.0)
+    scheduler.remove("a")
+
+    assert [key for key, _, _ in drain(scheduler, 3.0, 0.5)] == ["b"] * 4
+    assert len(scheduler) == 1
+
+
+@pytest.mark.parametrize("kwargs", [{"jitter": 1.0}, {"jitter": -0.1}])
+def test_invalid_jitter(kwargs):
+    with pytest.raises(ValueError):
+        SampleScheduler(**kwargs)
+
+
+def test_invalid_rate_and_duplicate_keys():
+    scheduler = SampleScheduler()
+    with pytest.raises(ValueError):
+        scheduler.add("a", 0.0, 0.0)
+    scheduler.add("a", 1.0, 0.0)
+    with pytest.raises(ValueError):
+        scheduler.add("a", 1.0, 0.0)
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.spill import RECORD_HEADER, SpillBuffer, decode_rows, encode_rows
+
+ORIGIN = datetime(2026, 1, 1)
+
+
+def make_rows(count, start=0, machine="M1"):
+    return [(machine, "Torque" if i % 2 else "Temperature", float(i), "u", ORIGIN + timedelta(seconds=i))
+            for i in range(start, start + count)]
+
+
+def replay(buffer):
+    """Drain a buffer like the ingestion writer does; returns every replayed row."""
+    replayed = []
+    while buffer.has_pending():
+        segment = buffer.next_segment()
+        for offset, rows in buffer.records(segment):
+            replayed.extend(rows)
+            buffer.commit(segment, offset)
+        buffer.remove(segment)
+    return replayed
+
+
+def test_rows_round_trip():
+    rows = make_rows(5) + [("M2", "Torque", -1e300, "", datetime(2026, 1, 1, 0, 0, 0, 999999))]
+    assert decode_rows(encode_rows(rows)) == rows
+
+
+def test_missing_value_round_trips_as_none():
+    rows = [("M1", "Torque", None, "u", ORIGIN)]
+    assert decode_rows(encode_rows(rows)) == rows
+
+
+def test_replay_returns_batches_in_order_and_empties_the_buffer(tmp_path):
+    buffer = SpillBuffer(tmp_path, segment_bytes=256)
+    batches = [make_rows(3, start) for start in range(0, 30, 3)]
+    for batch in batches:
+        buffer.append(batch)
+
+    assert buffer.stats()["segments"] > 1
+    assert replay(buffer) == [row for batch in batches for row in batch]
+    assert not buffer.has_pending()
+    buffer.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_segments_survive_a_restart(tmp_path):
+    buffer = SpillBuffer(tmp_path)
+    buffer.append(make_rows(4))
+    buffer.close()
+
+    reopened = SpillBuffer(tmp_path)
+    assert reopened.has_pending()
+    assert replay(reopened) == make_rows(4)
+
+
+def test_checkpoint_resumes_after_the_last_committed_record(tmp_path):
+    buffer = SpillBuffer(tmp_path)
+    buffer.append(make_rows(2))
+    buffer.append(make_rows(2, 2))
+    segment = buffer.next_segment()
+    offset, _ = next(iter(buffer.records(segment)))
+    buffer.commit(segment, offset)
+
+    assert [rows for _, rows in buffer.records(segment)] == [make_rows(2, 2)]
+
+
+def corrupt(path, position):
+    data = bytearray(path.read_bytes())
+    data[position] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+
+def test_corrupt_record_stops_the_segment(tmp_path):
+    buffer = SpillBuffer(tmp_path)
+    buffer.append(make_rows(2))
+    buffer.append(make_rows(2, 2))
+    buffer.append(make_rows(2, 4))
+    segment = buffer.next_segment()
+    first_length = RECORD_HEADER.size + RECORD_HEADER.unpack(segment.read_bytes()[:RECORD_HEADER.size])[0]
+    # Flip a byte in the body of the second record.
+    corrupt(segment, first_length + RECORD_HEADER.size + 4)
+
+    assert [rows for _, rows in buffer.records(segment)] == [make_rows(2)]
+    assert buffer.stats()["records_corrupt"] == 1
+
+
+@pytest.mark.parametrize("cut", [1, RECORD_HEADER.size + 1])
+def test_truncated_tail_is_skipped(tmp_path, cut):
+    buffer = SpillBuffer(tmp_path)
+    buffer.append(make_rows(2))
+    buffer.append(make_rows(2, 2))
+    segment = buffer.next_segment()
+    data = segment.read_bytes()
+    segment.write_bytes(data[:-cut])
+
+    assert [rows for _, rows in buffer.records(segment)] == [make_rows(2)]
+    assert buffer.stats()["records_corrupt"] == 1
+
+
+def test_size_limit_discards_the_oldest_segments(tmp_path):
+    record_size = RECORD_HEADER.size + len(encode_rows(make_rows(3)))
+    buffer = SpillBuffer(tmp_path, segment_bytes=record_size, max_bytes=3 * record_size)
+    for start in range(0, 30, 3):
+        buffer.append(make_rows(3, start))
+
+    stats = buffer.stats()
+    assert stats["pending_bytes"] <= 3 * record_size
+    assert stats["segments_discarded"] == 7
+    assert replay(buffer) == make_rows(9, 21)
@@ -4,31 +4,92 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import MachineChart from './MachineChart';
 
+// How often to poll for new readings, in milliseconds.
+const POLL_INTERVAL = 5000;
+// Number of most recent readings loaded on the first request and kept on screen.
+const HISTORY_SIZE = 1000;
+// Ids are assigned on insert, not on commit: with several ingestion workers or spill replay a
+// lower id can become visible after a higher one. Each poll therefore re-reads everything after
+// the highest id held this many polls ago and skips the readings already shown.
+const OVERLAP_POLLS = 6;
+
+const byTime = (a, b) => (a.timestamp < b.timestamp ? -1 : a.timestamp > b.timestamp ? 1 : a.id - b.id);
+
 const MachineDashboard = () => {
   const [measurements, setMeasurements] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
   useEffect(() => {
+    // Use the environment variable set in Docker Compose (REACT_APP_API_URL)
+    const baseURL = process.env.REACT_APP_API_URL || '';
+    // Specify the machine name as required by the backend endpoint
+    const machineName = "DrillingMachine";
+    // Highest reading id and ETag already received; later polls only ask for what is new.
+    let lastId = null;
+    let etag = null;
+    // lastId after each of the last OVERLAP_POLLS polls, oldest first.
+    let watermarks = [];
+    // Polls never overlap, even when following many pages takes longer than POLL_INTERVAL.
+    let polling = false;
+
+    const fetchPage = (params, headers = {}) => axios.get(`${baseURL}/api/machine-data`, {
+      params,
+      headers,
+      // 304 means nothing changed since the last poll.
+      validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+    });
+
     const fetchMeasurements = async () => {
+      if (polling) {
+        return;
+      }
+      polling = true;
       try {
-        // Use the environment variable set in Docker Compose (REACT_APP_API_URL)
-        const baseURL = process.env.REACT_APP_API_URL || '';
-        // Specify the machine name as required by the backend endpoint
-        const machineName = "DrillingMachine";
-        // Call the endpoint with the machine_name query parameter
-        const response = await axios.get(`${baseURL}/api/machine-data?machine_name=${machineName}`);
-        // The backend is expected to return an object like { data: [...] }
-        setMeasurements(response.data.data);
+        if (lastId === null) {
+          // The first request asks for the newest readings; the API pages oldest first otherwise.
+          const response = await fetchPage({ machine_name: machineName, order: 'desc', limit: HISTORY_SIZE });
+          // The backend is expected to return an object like { data: [...] }
+          const rows = response.data.data.slice().reverse();
+          lastId = rows.reduce((highest, row) => Math.max(highest, row.id), 0);
+          watermarks = [lastId];
+          setMeasurements(rows);
+        } else {
+          // Readings stored since the overlap window began, oldest first, following next_cursor
+          // until the backlog is drained. Only the first page is conditional.
+          const params = { machine_name: machineName, since_id: watermarks[0] };
+          let response = await fetchPage(params, etag ? { 'If-None-Match': etag } : {});
+          if (response.status !== 304) {
+            etag = response.headers.etag || null;
+            let rows = response.data.data;
+            while (response.data.next_cursor) {
+              response = await fetchPage({ ...params, cursor: response.data.next_cursor });
+              rows = rows.concat(response.data.data);
+            }
+            if (rows.length > 0) {
+              lastId = rows.reduce((highest, row) => Math.max(highest, row.id), lastId);
+              setMeasurements((previous) => {
+                const known = new Set(previous.map((row) => row.id));
+                const fresh = rows.filter((row) => !known.has(row.id));
+                return fresh.length > 0 ? previous.concat(fresh).sort(byTime).slice(-HISTORY_SIZE) : previous;
+              });
+            }
+          }
+          watermarks = watermarks.concat(lastId).slice(-OVERLAP_POLLS);
+        }
+        setError(null);
       } catch (err) {
         console.error("Error fetching measurements:", err);
         setError(err);
       } finally {
+        polling = false;
         setLoading(false);
       }
     };
 
     fetchMeasurements();
+    const interval = setInterval(fetchMeasurements, POLL_INTERVAL);
+    return () => clearInterval(interval);
   }, []);
 
   if (loading) return <div>Loading machine data...</div>;